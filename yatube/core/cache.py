@@ -0,0 +1,374 @@
+import os
+import pickle
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends import locmem
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.utils.functional import cached_property
+
+from . import instrumentation
+
+MISSING = object()
+
+
+class StatsCacheMixin:
+    """Считает попадания и промахи чтений для текущего запроса."""
+
+    def count(self, hits, misses):
+        metrics = instrumentation.current()
+        if metrics is not None:
+            metrics.cache_hits += hits
+            metrics.cache_misses += misses
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, MISSING, version)
+        if value is MISSING:
+            self.count(0, 1)
+            return default
+        self.count(1, 0)
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = super().get_many(keys, version)
+        self.count(len(found), len(keys) - len(found))
+        return found
+
+
+class LocMemCache(StatsCacheMixin, locmem.LocMemCache):
+    pass
+
+
+class SQLiteCache(BaseCache):
+    """Общий для всех процессов кеш в отдельном файле SQLite.
+
+    Целые числа хранятся как INTEGER, поэтому incr атомарен и не теряет
+    приращения от соседних процессов. Остальное хранится в pickle.
+    """
+
+    CULL_EVERY = 100
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.location = location
+        self._local = threading.local()
+
+    @property
+    def connection(self):
+        # Соединение своё у каждого потока и у каждого процесса после fork.
+        if getattr(self._local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(
+                self.location, timeout=5, isolation_level=None
+            )
+            connection.execute('PRAGMA journal_mode = wal')
+            connection.execute('PRAGMA synchronous = normal')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)'
+            )
+            connection.execute(
+                'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)'
+            )
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return self._local.connection
+
+    def encode(self, value):
+        if type(value) is int:
+            return value
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    def decode(self, value):
+        if isinstance(value, int):
+            return value
+        return pickle.loads(value)
+
+    def key(self, key, version):
+        key = self.make_key(key, version)
+        self.validate_key(key)
+        return key
+
+    def get(self, key, default=None, version=None):
+        row = self.connection.execute(
+            'SELECT value FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            [self.key(key, version), time.time()],
+        ).fetchone()
+        return default if row is None else self.decode(row[0])
+
+    def get_many(self, keys, version=None):
+        keys = {self.key(key, version): key for key in keys}
+        if not keys:
+            return {}
+        rows = self.connection.execute(
+            'SELECT key, value FROM cache WHERE key IN ({}) '
+            'AND (expires IS NULL OR expires > ?)'.format(
+                ', '.join('?' * len(keys))
+            ),
+            [*keys, time.time()],
+        )
+        return {keys[key]: self.decode(value) for key, value in rows}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.connection.execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires) '
+            'VALUES (?, ?, ?)',
+            [
+                self.key(key, version), self.encode(value),
+                self.get_backend_timeout(timeout),
+            ],
+        )
+        self.maybe_cull()
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        self.connection.executemany(
+            'INSERT OR REPLACE INTO cache (key, value, expires) '
+            'VALUES (?, ?, ?)',
+            [
+                (self.key(key, version), self.encode(value), expires)
+                for key, value in data.items()
+            ],
+        )
+        self.maybe_cull()
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        cursor = self.connection.execute(
+            'INSERT INTO cache (key, value, expires) VALUES (?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET value = excluded.value, '
+            'expires = excluded.expires '
+            'WHERE cache.expires IS NOT NULL AND cache.expires <= ?',
+            [
+                self.key(key, version), self.encode(value),
+                self.get_backend_timeout(timeout), time.time(),
+            ],
+        )
+        return cursor.rowcount == 1
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        cursor = self.connection.execute(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            [
+                self.get_backend_timeout(timeout), self.key(key, version),
+                time.time(),
+            ],
+        )
+        return cursor.rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        key = self.key(key, version)
+        connection = self.connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            cursor = connection.execute(
+                'UPDATE cache SET value = value + ? WHERE key = ? '
+                "AND typeof(value) = 'integer' "
+                'AND (expires IS NULL OR expires > ?)',
+                [delta, key, time.time()],
+            )
+            if cursor.rowcount != 1:
+                raise ValueError(f"Key '{key}' not found")
+            value = connection.execute(
+                'SELECT value FROM cache WHERE key = ?', [key]
+            ).fetchone()[0]
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+        return value
+
+    def delete(self, key, version=None):
+        cursor = self.connection.execute(
+            'DELETE FROM cache WHERE key = ?', [self.key(key, version)]
+        )
+        return cursor.rowcount == 1
+
+    def delete_many(self, keys, version=None):
+        self.connection.executemany(
+            'DELETE FROM cache WHERE key = ?',
+            [(self.key(key, version),) for key in keys],
+        )
+
+    def has_key(self, key, version=None):
+        return self.get(key, MISSING, version) is not MISSING
+
+    def clear(self):
+        self.connection.execute('DELETE FROM cache')
+
+    def maybe_cull(self):
+        """Изредка удаляет просроченное и самые старые записи сверх лимита."""
+        if random.randrange(self.CULL_EVERY):
+            return
+        connection = self.connection
+        connection.execute(
+            'DELETE FROM cache WHERE expires <= ?', [time.time()]
+        )
+        total = connection.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if total > self._max_entries and self._cull_frequency:
+            connection.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                'ORDER BY expires IS NULL, expires LIMIT ?)',
+                [total // self._cull_frequency],
+            )
+
+
+class LRU:
+    """Небольшой словарь в памяти процесса, вытесняющий давние записи."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value, expires = self.data.get(key, (MISSING, None))
+            if value is MISSING:
+                return MISSING
+            if expires <= time.monotonic():
+                del self.data[key]
+                return MISSING
+            self.data.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        if self.max_entries <= 0 or timeout <= 0:
+            return
+        with self.lock:
+            self.data[key] = (value, time.monotonic() + timeout)
+            self.data.move_to_end(key)
+            while len(self.data) > self.max_entries:
+                self.data.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+
+class BaseTwoLevelCache(BaseCache):
+    """LRU в памяти процесса перед общим кешем из CACHES[SHARED].
+
+    Локально хранятся только ключи с префиксами LOCAL_PREFIXES: их имя
+    уже содержит версии данных (фрагменты лент), поэтому смена версии в
+    общем кеше сразу видна всем процессам. Остальное, включая сами версии
+    и счётчики, читается из общего кеша. MAX_ENTRIES задаёт размер LRU.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.shared_alias = options.get('SHARED', 'shared')
+        self.local_timeout = options.get('LOCAL_TIMEOUT', 60)
+        self.local_prefixes = tuple(options.get('LOCAL_PREFIXES', ()))
+        self.local = LRU(self._max_entries)
+
+    @cached_property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    def local_key(self, key, version):
+        if key.startswith(self.local_prefixes):
+            return self.make_key(key, version)
+        return None
+
+    def local_timeout_for(self, timeout):
+        if timeout == DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is None:
+            return self.local_timeout
+        return min(timeout, self.local_timeout)
+
+    def get(self, key, default=None, version=None):
+        local_key = self.local_key(key, version)
+        if local_key is not None:
+            value = self.local.get(local_key)
+            if value is not MISSING:
+                return value
+        value = self.shared.get(key, MISSING, version)
+        if value is MISSING:
+            return default
+        if local_key is not None:
+            self.local.set(local_key, value, self.local_timeout)
+        return value
+
+    def get_many(self, keys, version=None):
+        found = {}
+        missing = []
+        for key in keys:
+            local_key = self.local_key(key, version)
+            value = MISSING if local_key is None else self.local.get(
+                local_key
+            )
+            if value is MISSING:
+                missing.append(key)
+            else:
+                found[key] = value
+        if missing:
+            shared = self.shared.get_many(missing, version)
+            for key, value in shared.items():
+                local_key = self.local_key(key, version)
+                if local_key is not None:
+                    self.local.set(local_key, value, self.local_timeout)
+            found.update(shared)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        if timeout == DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        self.shared.set(key, value, timeout, version)
+        local_key = self.local_key(key, version)
+        if local_key is not None:
+            self.local.set(local_key, value, self.local_timeout_for(timeout))
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        for key, value in data.items():
+            self.set(key, value, timeout, version)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        if timeout == DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        return self.shared.add(key, value, timeout, version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        if timeout == DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        return self.shared.touch(key, timeout, version)
+
+    def incr(self, key, delta=1, version=None):
+        local_key = self.local_key(key, version)
+        if local_key is not None:
+            self.local.delete(local_key)
+        return self.shared.incr(key, delta, version)
+
+    def delete(self, key, version=None):
+        local_key = self.local_key(key, version)
+        if local_key is not None:
+            self.local.delete(local_key)
+        return self.shared.delete(key, version)
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self.delete(key, version)
+
+    def has_key(self, key, version=None):
+        return self.get(key, MISSING, version) is not MISSING
+
+    def clear(self):
+        self.local.clear()
+        self.shared.clear()
+
+
+class TwoLevelCache(StatsCacheMixin, BaseTwoLevelCache):
+    pass
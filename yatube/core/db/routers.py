@@ -0,0 +1,59 @@
+import random
+import threading
+
+from django.conf import settings
+
+PIN_COOKIE = 'primary_pin'
+
+_state = threading.local()
+
+
+def use_replica():
+    """Выбирает реплику для чтения на время текущего запроса."""
+    _state.alias = (
+        random.choice(settings.DATABASE_REPLICAS)
+        if settings.DATABASE_REPLICAS else None
+    )
+    return _state.alias
+
+
+def reading_replica():
+    """Идёт ли чтение текущего запроса с реплики."""
+    return getattr(_state, 'alias', None) is not None
+
+
+def use_primary():
+    _state.alias = None
+
+
+def reset_writes():
+    _state.wrote = False
+
+
+def has_written():
+    """Писал ли текущий поток в базу с последнего reset_writes()."""
+    return getattr(_state, 'wrote', False)
+
+
+def is_pinned(request):
+    """Недавно писавший клиент читает с основной базы."""
+    return PIN_COOKIE in request.COOKIES
+
+
+class ReplicaRouter:
+    """Чтения внутри read_from_replica уходят на реплику, остальное на
+    основную базу. Реплики — копии основной, миграции идут только в неё.
+    """
+
+    def db_for_read(self, model, **hints):
+        return getattr(_state, 'alias', None)
+
+    def db_for_write(self, model, **hints):
+        _state.wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
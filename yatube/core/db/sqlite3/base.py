@@ -0,0 +1,64 @@
+"""SQLite для нескольких процессов и потоков: WAL, прагмы и BEGIN IMMEDIATE.
+
+Прагмы по умолчанию можно переопределить в DATABASES[...]['OPTIONS'] через
+ключ 'pragmas'.
+"""
+import os
+
+from django.db.backends.sqlite3 import base, creation
+
+PRAGMAS = {
+    # Читатели не блокируют писателя и друг друга.
+    'journal_mode': 'wal',
+    # В режиме WAL данные не теряются и без fsync на каждой транзакции.
+    'synchronous': 'normal',
+    # Кеш страниц 64 МБ (отрицательное значение задаётся в килобайтах).
+    'cache_size': -64000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'memory',
+    # Сколько миллисекунд ждать, пока другой писатель отпустит базу.
+    'busy_timeout': 5000,
+}
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    """Удаляет вместе с тестовой базой её файлы -wal и -shm."""
+
+    def remove_wal_files(self, test_database_name):
+        if self.is_in_memory_db(test_database_name):
+            return
+        for suffix in ('-wal', '-shm'):
+            try:
+                os.remove(test_database_name + suffix)
+            except FileNotFoundError:
+                pass
+
+    def _create_test_db(self, verbosity, autoclobber, keepdb=False):
+        if not keepdb:
+            self.remove_wal_files(self._get_test_db_name())
+        return super()._create_test_db(verbosity, autoclobber, keepdb)
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        super()._destroy_test_db(test_database_name, verbosity)
+        self.remove_wal_files(test_database_name)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        self.pragmas = {**PRAGMAS, **params.pop('pragmas', {})}
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        # Обычный BEGIN берёт блокировку на запись только на первой
+        # записи, и при встречной записи SQLite сразу отвечает
+        # "database is locked", не дожидаясь busy_timeout.
+        self.cursor().execute('BEGIN IMMEDIATE')
@@ -0,0 +1,54 @@
+import random
+import time
+from functools import wraps
+
+from django.db import OperationalError, connection, transaction
+
+from .db import routers
+
+LOCKED_RETRIES = 5
+LOCKED_BACKOFF = 0.05
+
+
+def is_locked(error):
+    return 'database is locked' in str(error)
+
+
+def retry_on_locked(write):
+    """Выполняет запись в транзакции и повторяет её, если база занята.
+
+    Оборачивает только сами сохранения: BEGIN IMMEDIATE сразу берёт
+    блокировку всей базы на запись, и держать её на чтениях, проверке
+    формы и пережатии картинки незачем. Паузы между попытками растут
+    вдвое и немного перемешаны, чтобы повторные записи разных потоков
+    не совпадали. Внутри внешней транзакции повтор невозможен, и ошибка
+    пробрасывается как есть.
+    """
+    @wraps(write)
+    def wrapper(*args, **kwargs):
+        if connection.in_atomic_block:
+            return write(*args, **kwargs)
+        for attempt in range(LOCKED_RETRIES):
+            try:
+                with transaction.atomic():
+                    return write(*args, **kwargs)
+            except OperationalError as error:
+                if not is_locked(error) or attempt == LOCKED_RETRIES - 1:
+                    raise
+            time.sleep(LOCKED_BACKOFF * 2 ** attempt * random.uniform(1, 2))
+    return wrapper
+
+
+def read_from_replica(view):
+    """Читает данные view с реплики, если клиент не закреплён за основной
+    базой после недавней записи."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if routers.is_pinned(request):
+            return view(request, *args, **kwargs)
+        routers.use_replica()
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            routers.use_primary()
+    return wrapper
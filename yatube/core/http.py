@@ -0,0 +1,59 @@
+"""Условные GET-запросы: ETag и Last-Modified считаются до рендеринга."""
+import hashlib
+
+from django.conf import settings
+from django.shortcuts import render
+from django.utils.cache import (
+    add_never_cache_headers, get_conditional_response, patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils.http import http_date, quote_etag
+
+
+def page_etag(request, parts):
+    """ETag из версий данных страницы, её адреса и посетителя."""
+    parts = [*parts, request.get_full_path(), request.user.pk]
+    if request.user.is_authenticated:
+        # В формы страницы зашит CSRF-токен, выданный под эту куку.
+        parts.append(request.COOKIES.get(settings.CSRF_COOKIE_NAME))
+    return quote_etag(hashlib.md5(repr(parts).encode()).hexdigest())
+
+
+def render_conditional(request, template_name, context, parts,
+                       last_modified=None):
+    """render(), который отвечает 304, если страница у клиента не устарела.
+
+    parts должны меняться вместе с содержимым страницы, last_modified —
+    время последнего изменения в секундах. Страницы гостей одинаковы для
+    всех, поэтому их может кешировать обратный прокси; страницы
+    пользователей личные и только перепроверяются. parts=None значит,
+    что содержимое может быть устаревшим: такая страница отдаётся без
+    валидаторов и не кешируется.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return render(request, template_name, context)
+    if parts is None:
+        response = render(request, template_name, context)
+        add_never_cache_headers(response)
+        return response
+    etag = page_etag(request, parts)
+    anonymous = not request.user.is_authenticated
+    if not anonymous:
+        last_modified = None
+    elif last_modified is not None:
+        last_modified = int(last_modified)
+    response = get_conditional_response(request, etag, last_modified)
+    if response is None:
+        response = render(request, template_name, context)
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    if anonymous:
+        patch_cache_control(
+            response, public=True, max_age=0,
+            s_maxage=settings.PUBLIC_PAGE_CACHE_SECONDS,
+        )
+    else:
+        patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ['Cookie'])
+    return response
@@ -0,0 +1,146 @@
+"""Замеры запросов к базе, шаблонов и кеша внутри одного HTTP-запроса."""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+MS_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+UNRESOLVED = '<unresolved>'
+
+_local = threading.local()
+_lock = threading.Lock()
+_stats = {}
+
+
+class Histogram:
+    """Счётчики по фиксированным корзинам, как у Prometheus."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def quantile(self, share):
+        """Верхняя граница корзины, в которую попал квантиль."""
+        rank = share * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'mean': round(self.total / self.count, 3) if self.count else 0,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+            'buckets': {
+                str(bound): count
+                for bound, count in zip(self.buckets + ('+Inf',), self.counts)
+            },
+        }
+
+
+class Metrics:
+    """Всё, что насчитали за один запрос."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view_name = None
+        self.total_ms = 0
+        self.queries = 0
+        self.db_ms = 0
+        self.template_ms = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # Пересчёты фрагментов и запросы, не ставшие пересчётом из-за них
+        self.recomputes = 0
+        self.collapsed = 0
+
+    def execute(self, execute, sql, params, many, context):
+        """Обёртка для connection.execute_wrapper."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_ms += (time.perf_counter() - started) * 1000
+
+    def finish(self):
+        self.total_ms = (time.perf_counter() - self.started) * 1000
+
+    def server_timing(self):
+        return ', '.join([
+            f'db;dur={self.db_ms:.1f};desc="{self.queries} queries"',
+            f'tpl;dur={self.template_ms:.1f}',
+            f'cache;desc="{self.cache_hits} hits, '
+            f'{self.cache_misses} misses"',
+            f'total;dur={self.total_ms:.1f}',
+        ])
+
+
+@contextmanager
+def collect(metrics):
+    """Делает metrics текущими для потока на время запроса."""
+    previous = getattr(_local, 'metrics', None)
+    _local.metrics = metrics
+    try:
+        yield metrics
+    finally:
+        _local.metrics = previous
+
+
+def current():
+    return getattr(_local, 'metrics', None)
+
+
+def record(name, metrics):
+    """Добавляет замеры запроса в гистограммы его маршрута."""
+    with _lock:
+        stats = _stats.get(name)
+        if stats is None:
+            stats = _stats[name] = {
+                'total_ms': Histogram(MS_BUCKETS),
+                'db_ms': Histogram(MS_BUCKETS),
+                'template_ms': Histogram(MS_BUCKETS),
+                'queries': Histogram(COUNT_BUCKETS),
+                'cache_hits': 0,
+                'cache_misses': 0,
+                'recomputes': 0,
+                'collapsed': 0,
+            }
+        stats['total_ms'].observe(metrics.total_ms)
+        stats['db_ms'].observe(metrics.db_ms)
+        stats['template_ms'].observe(metrics.template_ms)
+        stats['queries'].observe(metrics.queries)
+        stats['cache_hits'] += metrics.cache_hits
+        stats['cache_misses'] += metrics.cache_misses
+        stats['recomputes'] += metrics.recomputes
+        stats['collapsed'] += metrics.collapsed
+
+
+def snapshot():
+    """Агрегаты по маршрутам в виде, пригодном для JSON."""
+    with _lock:
+        return {
+            name: {
+                key: value.as_dict() if isinstance(value, Histogram) else value
+                for key, value in stats.items()
+            }
+            for name, stats in sorted(_stats.items())
+        }
+
+
+def reset():
+    with _lock:
+        _stats.clear()
@@ -0,0 +1,83 @@
+import glob
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.slow_queries import normalize
+
+
+def read_entries(path):
+    """Записи журнала вместе с ротированными файлами path.1, path.2, ..."""
+    paths = sorted(glob.glob(f'{path}.*'), reverse=True) + [path]
+    for name in paths:
+        try:
+            with open(name, encoding='utf-8') as log:
+                for line in log:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+        except FileNotFoundError:
+            continue
+
+
+class Command(BaseCommand):
+    help = 'Сводка журнала медленных запросов по отпечаткам SQL'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--log', default=settings.SLOW_QUERY_LOG, help='Файл журнала'
+        )
+        parser.add_argument('--view', help='Только запросы этого маршрута')
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument(
+            '--json', action='store_true', help='Вывести сводку в JSON'
+        )
+
+    def handle(self, *args, **options):
+        groups = {}
+        for entry in read_entries(options['log']):
+            if options['view'] and entry.get('view') != options['view']:
+                continue
+            group = groups.setdefault(entry['fingerprint'], {
+                'fingerprint': entry['fingerprint'],
+                'sql': normalize(entry['sql']),
+                'count': 0,
+                'total_ms': 0,
+                'max_ms': 0,
+                'views': {},
+                'stack': entry['stack'],
+                'plan': None,
+                'last_seen': None,
+            })
+            group['count'] += 1
+            group['total_ms'] += entry['ms']
+            group['max_ms'] = max(group['max_ms'], entry['ms'])
+            view = entry.get('view') or '-'
+            group['views'][view] = group['views'].get(view, 0) + 1
+            group['last_seen'] = entry['time']
+            if entry.get('plan'):
+                group['plan'] = entry['plan']
+        if not groups:
+            raise CommandError('Медленных запросов в журнале нет')
+        report = sorted(
+            groups.values(), key=lambda group: group['total_ms'], reverse=True
+        )[:options['limit']]
+        if options['json']:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+            return
+        for group in report:
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'{group["fingerprint"]}: {group["count"]} раз, '
+                f'всего {group["total_ms"]:.0f} мс, '
+                f'максимум {group["max_ms"]:.0f} мс'
+            ))
+            self.stdout.write(f'  {group["sql"]}')
+            self.stdout.write('  маршруты: ' + ', '.join(
+                f'{view} ({count})' for view, count in group['views'].items()
+            ))
+            for frame in group['stack']:
+                self.stdout.write(f'  {frame}')
+            for row in group['plan'] or ():
+                self.stdout.write(f'  план: {row}')
@@ -0,0 +1,124 @@
+import threading
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.db import connections
+
+from . import instrumentation, staticfiles
+from .db import routers
+
+
+class InstrumentationMiddleware:
+    """Считает время запроса, базы, шаблонов и обращения к кешу.
+
+    Итог уходит в заголовок Server-Timing и в гистограммы по имени
+    маршрута, которые отдаёт core:request_stats.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = instrumentation.Metrics()
+        with self.collect(metrics):
+            response = self.get_response(request)
+        metrics.finish()
+        match = request.resolver_match
+        name = match.view_name if match else instrumentation.UNRESOLVED
+        response['Server-Timing'] = metrics.server_timing()
+        if response.streaming:
+            response.streaming_content = self.stream(
+                response.streaming_content, metrics, name
+            )
+        else:
+            instrumentation.record(name, metrics)
+        return response
+
+    @staticmethod
+    @contextmanager
+    def collect(metrics):
+        with instrumentation.collect(metrics), ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(metrics.execute)
+                )
+            yield
+
+    def stream(self, content, metrics, name):
+        """Потоковое тело читается уже после view: замеряем и его.
+
+        Server-Timing к этому времени отправлен, в гистограммы же
+        попадает весь запрос.
+        """
+        try:
+            with self.collect(metrics):
+                yield from content
+        finally:
+            metrics.finish()
+            instrumentation.record(name, metrics)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = instrumentation.current()
+        if metrics is not None:
+            metrics.view_name = request.resolver_match.view_name
+
+
+class ReplicaPinMiddleware:
+    """После записи в базу закрепляет клиента за основной базой.
+
+    Пока реплики догоняют основную базу, клиент с кукой читает свои же
+    изменения с основной, см. core.decorators.read_from_replica. Запись
+    замечает роутер, поэтому учитываются и GET вроде profile_follow.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        routers.reset_writes()
+        response = self.get_response(request)
+        if settings.DATABASE_REPLICAS and routers.has_written():
+            response.set_cookie(
+                routers.PIN_COOKIE, '1',
+                max_age=settings.REPLICA_PIN_SECONDS, httponly=True,
+            )
+        return response
+
+
+class StaticFilesMiddleware:
+    """Отдаёт собранную collectstatic статику раньше остальной цепочки.
+
+    Файлы из STATIC_ROOT переписываются при первом запросе, поэтому
+    после collectstatic приложение нужно перезапустить. Чего нет в
+    STATIC_ROOT, обрабатывается как обычно: в разработке статику из
+    STATICFILES_DIRS отдаёт runserver.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.files = None
+        self.lock = threading.Lock()
+
+    def get_files(self):
+        with self.lock:
+            if self.files is None:
+                self.files = {}
+                if settings.STATIC_ROOT:
+                    self.files = staticfiles.scan(
+                        settings.STATIC_ROOT,
+                        set(getattr(staticfiles_storage, 'hashed_files', {})
+                            .values()),
+                    )
+        return self.files
+
+    def __call__(self, request):
+        path = request.path_info
+        if (
+            request.method in ('GET', 'HEAD')
+            and path.startswith(settings.STATIC_URL)
+        ):
+            file = self.get_files().get(path[len(settings.STATIC_URL):])
+            if file is not None:
+                return file.response(request)
+        return self.get_response(request)
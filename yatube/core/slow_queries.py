@@ -0,0 +1,100 @@
+"""Журнал медленных SQL-запросов с планом выполнения для части из них."""
+import hashlib
+import json
+import logging
+import random
+import re
+import time
+import traceback
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import instrumentation
+
+logger = logging.getLogger('yatube.slow_queries')
+
+STRING = re.compile(r"'(?:[^']|'')*'")
+NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+IN_LIST = re.compile(r'\bIN \((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+SPACES = re.compile(r'\s+')
+STACK_DEPTH = 5
+
+
+def normalize(sql):
+    """SQL без значений: одинаковые запросы с разными аргументами совпадут."""
+    sql = STRING.sub('?', sql)
+    sql = NUMBER.sub('?', sql).replace('%s', '?')
+    sql = IN_LIST.sub('IN (...)', sql)
+    return SPACES.sub(' ', sql).strip()
+
+
+def fingerprint(sql):
+    return hashlib.md5(normalize(sql).encode()).hexdigest()[:12]
+
+
+def stack_summary():
+    """Последние кадры стека из кода проекта, без Django и библиотек."""
+    frames = [
+        frame for frame in traceback.extract_stack()[:-3]
+        if frame.filename.startswith(settings.BASE_DIR)
+        and 'site-packages' not in frame.filename
+        and not frame.filename.endswith('slow_queries.py')
+    ]
+    return [
+        f'{frame.filename[len(settings.BASE_DIR) + 1:]}:{frame.lineno} '
+        f'in {frame.name}'
+        for frame in frames[-STACK_DEPTH:]
+    ]
+
+
+def explain(connection, sql, params):
+    """План запроса через отдельный курсор, мимо обёрток execute."""
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return None
+    cursor = connection.create_cursor()
+    try:
+        cursor.execute(f'{connection.ops.explain_prefix} {sql}', params)
+        return [' '.join(map(str, row)) for row in cursor.fetchall()]
+    except Exception as error:
+        return [f'EXPLAIN не удался: {error}']
+    finally:
+        cursor.close()
+
+
+def log_slow_queries(execute, sql, params, many, context):
+    """Обёртка execute, которая пишет в журнал запросы дольше порога."""
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = (time.perf_counter() - started) * 1000
+        threshold = settings.SLOW_QUERY_MS
+        if threshold is not None and duration >= threshold:
+            metrics = instrumentation.current()
+            entry = {
+                'time': timezone.now().isoformat(),
+                'ms': round(duration, 3),
+                'fingerprint': fingerprint(sql),
+                'sql': sql,
+                'params': None if many else params,
+                'view': metrics.view_name if metrics else None,
+                'stack': stack_summary(),
+                'plan': None,
+            }
+            sampled = random.random() < settings.SLOW_QUERY_EXPLAIN_RATE
+            if sampled and not many:
+                entry['plan'] = explain(context['connection'], sql, params)
+            logger.warning(
+                json.dumps(entry, ensure_ascii=False, default=str)
+            )
+
+
+def install(sender, connection, **kwargs):
+    """Подключает журнал к каждому новому соединению с базой.
+
+    Обёртка встаёт в начало списка: временные обёртки снимаются через
+    pop() и не должны задеть постоянную.
+    """
+    if log_slow_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, log_slow_queries)
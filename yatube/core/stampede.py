@@ -0,0 +1,91 @@
+"""Кеширование дорогих фрагментов без лавины пересчётов.
+
+Когда запись устаревает, пересчитывает её только один запрос, взявший
+короткую блокировку. Остальные тем временем получают прежнее значение,
+а если его нет, ждут результата. Чтобы записи не устаревали у всех
+разом, пересчёт иногда начинается чуть раньше срока (XFetch): чем
+дольше считается значение, тем раньше.
+"""
+import math
+import random
+import time
+
+from django.core.cache import cache as default_cache
+
+from . import instrumentation
+
+MISSING = object()
+LOCK_KEY = 'stampede:lock:{}'
+STALE_KEY = 'stampede:stale:{}'
+# Сколько секунд держится блокировка, если пересчитавший запрос упал
+LOCK_TIMEOUT = 5
+# Сколько секунд устаревшее значение может отдаваться во время пересчёта
+STALE_TIMEOUT = 60
+# Насколько охотно пересчёт начинается до срока; 0 отключает его
+EARLY_BETA = 1.0
+WAIT_STEP = 0.05
+
+
+def count(recomputes=0, collapsed=0):
+    metrics = instrumentation.current()
+    if metrics is not None:
+        metrics.recomputes += recomputes
+        metrics.collapsed += collapsed
+
+
+def expires_early(expires, delta):
+    """Решает, пересчитывать ли запись, не дожидаясь срока."""
+    if expires is None:
+        return False
+    early = -delta * EARLY_BETA * math.log(1 - random.random())
+    return time.time() + early >= expires
+
+
+def recompute(cache, key, compute, timeout, stale_key):
+    started = time.time()
+    value = compute()
+    delta = time.time() - started
+    expires = None if timeout is None else started + delta + timeout
+    physical = None if timeout is None else timeout + STALE_TIMEOUT
+    cache.set(key, (value, expires, delta), physical)
+    if stale_key is not None:
+        cache.set(STALE_KEY.format(stale_key), value, physical)
+    count(recomputes=1)
+    return value
+
+
+def get_or_compute(key, compute, timeout, stale_key=None, cache=None):
+    """Значение из кеша по key или результат compute().
+
+    stale_key задаёт запись, которая переживает смену key: например,
+    страница ленты без версий. Её отдают, пока новую версию считает
+    другой запрос.
+    """
+    cache = cache or default_cache
+    stale = MISSING
+    envelope = cache.get(key)
+    if envelope is not None:
+        value, expires, delta = envelope
+        if not expires_early(expires, delta):
+            return value
+        stale = value
+    lock_key = LOCK_KEY.format(key)
+    if cache.add(lock_key, 1, LOCK_TIMEOUT):
+        try:
+            return recompute(cache, key, compute, timeout, stale_key)
+        finally:
+            cache.delete(lock_key)
+    if stale is MISSING and stale_key is not None:
+        stale = cache.get(STALE_KEY.format(stale_key), MISSING)
+    if stale is not MISSING:
+        count(collapsed=1)
+        return stale
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_STEP)
+        envelope = cache.get(key)
+        if envelope is not None:
+            count(collapsed=1)
+            return envelope[0]
+    # Пересчитывавший запрос не уложился в блокировку: считаем сами.
+    return recompute(cache, key, compute, timeout, stale_key)
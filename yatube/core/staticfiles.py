@@ -0,0 +1,178 @@
+"""Статика с хешем в именах, заранее сжатыми копиями и долгим кешем.
+
+collectstatic пишет файлы под именами с хешем содержимого и кладёт
+рядом .gz и, если установлен пакет brotli, .br. StaticFilesMiddleware
+отдаёт их из STATIC_ROOT самим WSGI-приложением, выбирая копию по
+Accept-Encoding, так что отдельный сервер для статики не нужен.
+"""
+import gzip
+import io
+import mimetypes
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = (
+    '.css', '.js', '.svg', '.ico', '.json', '.map', '.txt', '.xml',
+    '.html', '.webmanifest',
+)
+# Сжатая копия хранится, только если она заметно меньше оригинала
+MAX_COMPRESSED_RATIO = 0.95
+# Файл с хешем в имени никогда не меняется
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+TEXT_TYPES = ('application/javascript', 'application/json', 'image/svg+xml')
+
+
+def gzip_compress(data):
+    # mtime=0: повторный collectstatic даёт те же байты.
+    output = io.BytesIO()
+    with gzip.GzipFile(fileobj=output, mode='wb', compresslevel=9,
+                       mtime=0) as file:
+        file.write(data)
+    return output.getvalue()
+
+
+# Порядок важен: при равном выборе клиенту отдаётся первое сжатие
+ENCODINGS = [('gzip', '.gz', gzip_compress)]
+if brotli is not None:
+    ENCODINGS.insert(0, ('br', '.br', brotli.compress))
+
+
+def compress(path):
+    """Пишет рядом с файлом сжатые копии, если от них есть толк."""
+    with open(path, 'rb') as file:
+        data = file.read()
+    for _, suffix, compressor in ENCODINGS:
+        compressed = compressor(data)
+        if len(compressed) <= len(data) * MAX_COMPRESSED_RATIO:
+            with open(path + suffix, 'wb') as file:
+                file.write(compressed)
+        elif os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Имена с хешем содержимого и сжатые копии каждого файла.
+
+    Пока collectstatic не запускали (разработка, тесты), url() отдаёт
+    обычные имена вместо ошибки.
+    """
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in sorted({*paths, *self.hashed_files.values()}):
+            if name.endswith(COMPRESSIBLE):
+                compress(self.path(name))
+
+
+def accepted_encodings(header):
+    """Сжатия из Accept-Encoding, кроме запрещённых через q=0."""
+    accepted = set()
+    for item in header.split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0
+        if coding and quality > 0:
+            accepted.add(coding.lower())
+    if '*' in accepted:
+        accepted.update(encoding for encoding, _, _ in ENCODINGS)
+    return accepted
+
+
+class StaticFile:
+    """Файл из STATIC_ROOT и его сжатые копии."""
+
+    def __init__(self, path, immutable):
+        self.path = path
+        stat = os.stat(path)
+        self.size = stat.st_size
+        self.last_modified = int(stat.st_mtime)
+        self.immutable = immutable
+        content_type, _ = mimetypes.guess_type(path)
+        content_type = content_type or 'application/octet-stream'
+        if content_type.startswith('text/') or content_type in TEXT_TYPES:
+            content_type += '; charset=utf-8'
+        self.content_type = content_type
+        self.variants = [
+            (encoding, path + suffix, os.path.getsize(path + suffix))
+            for encoding, suffix, _ in ENCODINGS
+            if os.path.exists(path + suffix)
+        ]
+
+    def choose(self, request):
+        accepted = accepted_encodings(
+            request.META.get('HTTP_ACCEPT_ENCODING', '')
+        )
+        for encoding, path, size in self.variants:
+            if encoding in accepted:
+                return encoding, path, size
+        return None, self.path, self.size
+
+    def response(self, request):
+        encoding, path, size = self.choose(request)
+        etag = f'"{self.size:x}-{self.last_modified:x}-{encoding or "id"}"'
+        response = get_conditional_response(
+            request, etag, self.last_modified
+        )
+        if response is None:
+            if request.method == 'HEAD':
+                response = HttpResponse(content_type=self.content_type)
+            else:
+                response = FileResponse(
+                    open(path, 'rb'), content_type=self.content_type
+                )
+            response['Content-Length'] = size
+            if encoding is not None:
+                response['Content-Encoding'] = encoding
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(self.last_modified)
+        if self.immutable:
+            response['Cache-Control'] = (
+                f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+            )
+        else:
+            response['Cache-Control'] = (
+                f'public, max-age={settings.STATIC_MAX_AGE}'
+            )
+        if self.variants:
+            patch_vary_headers(response, ['Accept-Encoding'])
+        return response
+
+
+def scan(root, hashed_names):
+    """{имя относительно STATIC_ROOT: StaticFile} для всех файлов."""
+    suffixes = tuple(suffix for _, suffix, _ in ENCODINGS)
+    files = {}
+    for directory, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(directory, name)
+            if name.endswith(suffixes) and os.path.exists(
+                path[:path.rindex('.')]
+            ):
+                continue
+            relative = os.path.relpath(path, root).replace(os.sep, '/')
+            files[relative] = StaticFile(path, relative in hashed_names)
+    return files
@@ -0,0 +1,26 @@
+import time
+
+from django.template.backends import django
+
+from . import instrumentation
+
+
+class Template(django.Template):
+    def render(self, context=None, request=None):
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics = instrumentation.current()
+            if metrics is not None:
+                metrics.template_ms += (time.perf_counter() - started) * 1000
+
+
+class DjangoTemplates(django.DjangoTemplates):
+    """Шаблоны Django, которые засекают время отрисовки."""
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return Template(super().get_template(template_name).template, self)
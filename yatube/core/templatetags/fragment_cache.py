@@ -0,0 +1,66 @@
+from django import template
+from django.core.cache.utils import make_template_fragment_key
+from django.templatetags.cache import CacheNode
+
+from core import stampede
+
+register = template.Library()
+
+
+class FragmentCacheNode(CacheNode):
+    def __init__(self, nodelist, expire_time_var, fragment_name, vary_on,
+                 stale_var):
+        super().__init__(
+            nodelist, expire_time_var, fragment_name, vary_on, None
+        )
+        self.stale_var = stale_var
+
+    def render(self, context):
+        try:
+            expire_time = self.expire_time_var.resolve(context)
+        except template.VariableDoesNotExist:
+            raise template.TemplateSyntaxError(
+                f'"fragment_cache" tag got an unknown variable: '
+                f'{self.expire_time_var.var!r}'
+            )
+        if expire_time is not None:
+            expire_time = int(expire_time)
+            if expire_time == 0:
+                return self.nodelist.render(context)
+        key = make_template_fragment_key(
+            self.fragment_name,
+            [var.resolve(context) for var in self.vary_on],
+        )
+        stale_key = None
+        if self.stale_var is not None:
+            stale_key = make_template_fragment_key(
+                self.fragment_name, [self.stale_var.resolve(context)]
+            )
+        return stampede.get_or_compute(
+            key, lambda: self.nodelist.render(context), expire_time,
+            stale_key,
+        )
+
+
+@register.tag('fragment_cache')
+def do_fragment_cache(parser, token):
+    """Как {% cache %}, но без лавины пересчётов, см. core.stampede.
+
+    {% fragment_cache timeout name key... stale=stale_key %}
+    Пока один запрос пересчитывает фрагмент, остальные получают прежнюю
+    запись для stale_key. Timeout 0 выводит фрагмент без кеша.
+    """
+    nodelist = parser.parse(('endfragment_cache',))
+    parser.delete_first_token()
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(
+            f'{bits[0]!r} tag requires at least 2 arguments.'
+        )
+    stale_var = None
+    if len(bits) > 3 and bits[-1].startswith('stale='):
+        stale_var = parser.compile_filter(bits.pop()[len('stale='):])
+    return FragmentCacheNode(
+        nodelist, parser.compile_filter(bits[1]), bits[2],
+        [parser.compile_filter(bit) for bit in bits[3:]], stale_var,
+    )
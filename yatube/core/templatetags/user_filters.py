@@ -1,4 +1,5 @@
 from django import template
+from django.http import QueryDict
 # В template.Library зарегистрированы все встроенные теги и фильтры шаблонов;
 # добавляем к ним и наш фильтр.
 register = template.Library()
@@ -7,3 +8,24 @@ register = template.Library()
 @register.filter
 def addclass(field, css):
     return field.as_widget(attrs={'class': css})
+
+
+@register.simple_tag(takes_context=True)
+def query_replace(context, **kwargs):
+    """Строка запроса с заменёнными параметрами.
+
+    Из текущего запроса берутся только параметры, перечисленные через
+    запятую в keep_params: ссылки пагинатора попадают в общий для всех
+    кеш лент, и случайные параметры первого посетителя в них не нужны.
+    Параметр со значением None удаляется.
+    """
+    keep = context.get('keep_params', '').split(',')
+    query = QueryDict(mutable=True)
+    for key, values in context['request'].GET.lists():
+        if key in keep:
+            query.setlist(key, values)
+    for key, value in kwargs.items():
+        query.pop(key, None)
+        if value is not None:
+            query[key] = value
+    return query.urlencode()
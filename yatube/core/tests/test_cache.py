@@ -0,0 +1,110 @@
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from .. import instrumentation, stampede
+from ..cache import SQLiteCache, TwoLevelCache
+
+
+class CacheBackendTest(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.shared = SQLiteCache(
+            os.path.join(directory.name, 'cache.sqlite3'), {}
+        )
+
+    def test_sqlite_cache(self):
+        shared = self.shared
+        shared.set('text', {'a': 'Текст'})
+        self.assertEqual(shared.get('text'), {'a': 'Текст'})
+        self.assertFalse(shared.add('text', 'другой'))
+        self.assertTrue(shared.add('counter', 1))
+        self.assertEqual(shared.incr('counter', 5), 6)
+        self.assertEqual(shared.decr('counter'), 5)
+        with self.assertRaises(ValueError):
+            shared.incr('missing')
+        shared.set('expired', 1, timeout=0)
+        self.assertIsNone(shared.get('expired'))
+        self.assertTrue(shared.add('expired', 2))
+        self.assertEqual(
+            shared.get_many(['text', 'counter', 'missing']),
+            {'text': {'a': 'Текст'}, 'counter': 5},
+        )
+        shared.delete('text')
+        self.assertFalse(shared.has_key('text'))
+
+    def test_two_level_cache_keeps_only_versioned_keys_local(self):
+        """Изменения в общем кеше сразу видны для всего, кроме фрагментов,
+        чьи ключи и так меняются вместе с версией."""
+        two_level = TwoLevelCache('', {
+            'OPTIONS': {'SHARED': 'shared', 'LOCAL_PREFIXES': ['frag:']},
+        })
+        two_level.shared = self.shared
+        two_level.set('frag:1', 'фрагмент')
+        two_level.set('version', 1)
+        self.shared.set('frag:1', 'другой процесс')
+        self.shared.set('version', 2)
+        self.assertEqual(two_level.get('frag:1'), 'фрагмент')
+        self.assertEqual(two_level.get('version'), 2)
+        self.assertEqual(
+            two_level.get_many(['frag:1', 'version']),
+            {'frag:1': 'фрагмент', 'version': 2},
+        )
+        two_level.clear()
+        self.assertIsNone(two_level.get('frag:1'))
+
+
+class StampedeTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = []
+
+    def compute(self, value='новое'):
+        self.calls.append(value)
+        time.sleep(0.2)
+        return value
+
+    def test_concurrent_misses_collapse_into_one_recompute(self):
+        results = []
+        collapsed = []
+
+        def fetch():
+            with instrumentation.collect(instrumentation.Metrics()) as m:
+                results.append(stampede.get_or_compute(
+                    'fragment', self.compute, 60
+                ))
+            collapsed.append(m.collapsed)
+
+        threads = [threading.Thread(target=fetch) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.calls, ['новое'])
+        self.assertEqual(results, ['новое'] * 4)
+        self.assertEqual(sum(collapsed), 3)
+
+    def test_stale_value_served_while_locked(self):
+        stampede.get_or_compute('v1', lambda: 'старое', 60, 'page')
+        cache.add(stampede.LOCK_KEY.format('v2'), 1)
+        with instrumentation.collect(instrumentation.Metrics()) as metrics:
+            value = stampede.get_or_compute('v2', self.compute, 60, 'page')
+        self.assertEqual(value, 'старое')
+        self.assertEqual(self.calls, [])
+        self.assertEqual(metrics.collapsed, 1)
+
+    def test_recompute_starts_before_expiry(self):
+        cache.set('fragment', ('старое', time.time() + 1, 10))
+        with mock.patch.object(stampede.random, 'random', return_value=0.5):
+            value = stampede.get_or_compute('fragment', self.compute, 60)
+        self.assertEqual(value, 'новое')
+        cache.set('fragment', ('старое', time.time() + 60, 0.01))
+        with mock.patch.object(stampede.random, 'random', return_value=0.5):
+            value = stampede.get_or_compute('fragment', self.compute, 60)
+        self.assertEqual(value, 'старое')
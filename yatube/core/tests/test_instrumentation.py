@@ -0,0 +1,44 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Post, User
+
+USERNAME = 'tester'
+INDEX = reverse('posts:index')
+
+
+class InstrumentationTest(TestCase):
+    STATS = reverse('core:request_stats')
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+
+    def setUp(self):
+        cache.clear()
+        self.staff_client = Client()
+        self.staff_client.force_login(self.staff)
+        self.staff_client.delete(self.STATS)
+
+    def test_server_timing_header(self):
+        Post.objects.create(author=self.user, text='Текст')
+        timing = self.client.get(INDEX)['Server-Timing']
+        for metric in ('db;dur=', 'tpl;dur=', 'cache;desc=', 'total;dur='):
+            self.assertIn(metric, timing)
+        self.assertNotIn('"0 queries"', timing)
+
+    def test_stats_are_grouped_by_url_name(self):
+        self.client.get(INDEX)
+        self.client.get(INDEX)
+        stats = self.staff_client.get(self.STATS).json()
+        self.assertEqual(stats['posts:index']['total_ms']['count'], 2)
+        self.assertGreater(stats['posts:index']['cache_misses'], 0)
+        self.assertGreater(stats['posts:index']['cache_hits'], 0)
+
+    def test_stats_are_staff_only(self):
+        client = Client()
+        client.force_login(self.user)
+        self.assertEqual(client.get(self.STATS).status_code, 302)
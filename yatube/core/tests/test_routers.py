@@ -0,0 +1,67 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post, User
+
+from ..db.routers import PIN_COOKIE, ReplicaRouter
+from ..decorators import read_from_replica
+
+USERNAME = 'tester'
+INDEX = reverse('posts:index')
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.author = User.objects.create_user(username='author')
+
+    @staticmethod
+    @read_from_replica
+    def read_view(request):
+        return HttpResponse(Post.objects.all().db)
+
+    def test_read_views_use_replica(self):
+        request = RequestFactory().get(INDEX)
+        self.assertEqual(self.read_view(request).content, b'replica')
+        self.assertEqual(Post.objects.all().db, 'default')
+
+    def test_pinned_client_reads_primary(self):
+        factory = RequestFactory()
+        factory.cookies[PIN_COOKIE] = '1'
+        request = factory.get(INDEX)
+        self.assertEqual(self.read_view(request).content, b'default')
+
+    def test_write_pins_client_to_primary(self):
+        client = Client()
+        client.force_login(self.user)
+        response = client.get(
+            reverse('posts:profile_follow', args=[self.author.username])
+        )
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertNotIn(PIN_COOKIE, client.get(INDEX).cookies)
+
+    @override_settings(DATABASE_REPLICAS=[])
+    @mock.patch('posts.feeds.routers.reading_replica', return_value=True)
+    def test_lagging_replica_pages_are_not_cached(self, reading_replica):
+        '''Сразу после записи страница с реплики не кешируется'''
+        cache.clear()
+        post = Post.objects.create(author=self.author, text='Старый текст')
+        response = self.client.get(INDEX)
+        self.assertFalse(response.has_header('ETag'))
+        self.assertIn('no-cache', response['Cache-Control'])
+        Post.objects.filter(pk=post.pk).update(text='Новый текст')
+        self.assertContains(self.client.get(INDEX), 'Новый текст')
+        with override_settings(REPLICA_PIN_SECONDS=0):
+            self.assertTrue(self.client.get(INDEX).has_header('ETag'))
+
+    def test_replicas_are_not_migrated(self):
+        router = ReplicaRouter()
+        self.assertTrue(router.allow_migrate('default', 'posts'))
+        self.assertFalse(router.allow_migrate('replica', 'posts'))
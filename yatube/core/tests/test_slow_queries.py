@@ -0,0 +1,55 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.models import Group
+
+SLUG = 'test-slug'
+GROUP = reverse('posts:group', kwargs={'slug': SLUG})
+
+
+class SlowQueryLogTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(title='Группа', slug=SLUG)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_slow_queries_are_logged_with_plan(self):
+        with self.settings(SLOW_QUERY_MS=0, SLOW_QUERY_EXPLAIN_RATE=1):
+            with self.assertLogs('yatube.slow_queries', 'WARNING') as logs:
+                self.client.get(GROUP)
+        entries = [json.loads(record.getMessage()) for record in logs.records]
+        group_query = next(
+            entry for entry in entries
+            if entry['view'] == 'posts:group'
+            and 'posts_group' in entry['sql']
+        )
+        self.assertEqual(group_query['params'], [SLUG])
+        self.assertTrue(group_query['plan'])
+        self.assertTrue(
+            any('posts/views.py' in frame for frame in group_query['stack'])
+        )
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        log = os.path.join(directory.name, 'slow.log')
+        with open(log, 'w', encoding='utf-8') as output:
+            output.writelines(
+                record.getMessage() + '\n' for record in logs.records
+            )
+        out = StringIO()
+        call_command(
+            'slow_queries', log=log, view='posts:group', json=True, stdout=out
+        )
+        report = json.loads(out.getvalue())
+        fingerprints = [group['fingerprint'] for group in report]
+        self.assertIn(group_query['fingerprint'], fingerprints)
+        self.assertEqual(len(fingerprints), len(set(fingerprints)))
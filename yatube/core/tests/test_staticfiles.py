@@ -0,0 +1,71 @@
+import gzip
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.management import call_command
+from django.templatetags.static import static
+from django.test import TestCase, override_settings
+
+TEMP_STATIC_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(STATIC_ROOT=TEMP_STATIC_ROOT)
+class StaticFilesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command('collectstatic', interactive=False, verbosity=0)
+        with open(os.path.join(
+            settings.BASE_DIR, 'static', 'css', 'bootstrap.min.css'
+        ), 'rb') as file:
+            cls.css = file.read()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_STATIC_ROOT, ignore_errors=True)
+
+    def get(self, url, **headers):
+        response = self.client.get(url, **headers)
+        response.body = response.getvalue()
+        return response
+
+    def test_hashed_name_is_immutable_and_compressed(self):
+        url = static('css/bootstrap.min.css')
+        self.assertRegex(url, r'/bootstrap\.min\.[0-9a-f]{12}\.css$')
+        response = self.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertTrue(response['Content-Type'].startswith('text/css'))
+        self.assertEqual(gzip.decompress(response.body), self.css)
+        response = self.get(url, HTTP_IF_NONE_MATCH=response['ETag'],
+                            HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 304)
+
+    def test_identity_when_not_accepted(self):
+        url = static('css/bootstrap.min.css')
+        for accept in ('', 'gzip;q=0, identity'):
+            with self.subTest(accept=accept):
+                response = self.get(url, HTTP_ACCEPT_ENCODING=accept)
+                self.assertFalse(response.has_header('Content-Encoding'))
+                self.assertEqual(response.body, self.css)
+                self.assertEqual(
+                    int(response['Content-Length']), len(self.css)
+                )
+
+    def test_unhashed_name_cached_briefly(self):
+        response = self.get(settings.STATIC_URL + 'css/bootstrap.min.css')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('immutable', response['Cache-Control'])
+        self.assertIn(
+            f'max-age={settings.STATIC_MAX_AGE}', response['Cache-Control']
+        )
+
+    def test_head_has_no_body(self):
+        response = self.client.head(static('img/logo.png'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'')
+        self.assertFalse(response.has_header('Content-Encoding'))
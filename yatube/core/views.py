@@ -1,4 +1,9 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
 from django.shortcuts import render
+from django.views.decorators.http import require_http_methods
+
+from . import instrumentation
 
 
 def page_not_found(request, exception):
@@ -15,3 +20,12 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+@staff_member_required
+@require_http_methods(['GET', 'DELETE'])
+def request_stats(request):
+    """Гистограммы времени и запросов к базе по именам маршрутов."""
+    if request.method == 'DELETE':
+        instrumentation.reset()
+    return JsonResponse(instrumentation.snapshot())
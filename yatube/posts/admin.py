@@ -1,9 +1,24 @@
 from django.contrib import admin
 
-from .models import Comment, Follow, Group, Post
+from .models import Comment, Follow, Group, Post, UserStats
+from .search import filter_matching
 
 
-class PostAdmin(admin.ModelAdmin):
+class CountersAdmin(admin.ModelAdmin):
+    """Правка пишет только изменённые поля формы.
+
+    Полное сохранение вернуло бы счётчики, прочитанные при открытии
+    формы, поверх параллельных F()-обновлений из сигналов.
+    """
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            obj.save(update_fields=form.changed_data)
+        else:
+            obj.save()
+
+
+class PostAdmin(CountersAdmin):
     list_display = (
         'pk',
         'text',
@@ -16,6 +31,11 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return filter_matching(queryset, search_term), False
+
 
 class CommentAdmin(admin.ModelAdmin):
     list_display = ('text', 'author', 'post')
@@ -25,7 +45,7 @@ class FollowAdmin(admin.ModelAdmin):
     list_display = ('author', 'user')
 
 
-class GroupAdmin(admin.ModelAdmin):
+class GroupAdmin(CountersAdmin):
     list_display = (
         'title',
         'description',
@@ -33,7 +53,18 @@ class GroupAdmin(admin.ModelAdmin):
     search_fields = ('title',)
 
 
+class UserStatsAdmin(CountersAdmin):
+    list_display = (
+        'user',
+        'posts_count',
+        'followers_count',
+        'following_count',
+    )
+    readonly_fields = ('posts_count', 'followers_count', 'following_count')
+
+
 admin.site.register(Post, PostAdmin)
 admin.site.register(Comment, CommentAdmin)
 admin.site.register(Follow, FollowAdmin)
 admin.site.register(Group, GroupAdmin)
+admin.site.register(UserStats, UserStatsAdmin)
@@ -0,0 +1,269 @@
+"""JSON API только для чтения: посты, группы, профили, комментарии, лента.
+
+Строки читаются через .values(), без создания моделей. ?fields= выбирает
+поля, ?cursor= и ?limit= листают страницы, а ?stream=1 отдаёт всю
+выборку одним потоковым ответом.
+"""
+from functools import wraps
+
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.functional import SimpleLazyObject
+from django.views.decorators.http import require_GET
+
+from core.decorators import read_from_replica
+
+from .follows import following_ids
+from .models import Comment, Group, Post, User
+from .paginators import CursorPaginator, InvalidCursor
+from .settings import API_MAX_PAGE_SIZE, API_PAGE_SIZE, API_STREAM_CHUNK
+from .timeline import timeline_queryset
+
+
+class ApiError(Exception):
+    pass
+
+
+def media_url(name):
+    return default_storage.url(name) if name else None
+
+
+class Resource:
+    """Публичные поля ресурса, поля базы за ними и порядок в списках."""
+
+    def __init__(self, fields, ordering, convert=None):
+        self.fields = fields
+        self.ordering = ordering
+        self.convert = convert or {}
+
+    def select(self, request):
+        """Поля из ?fields=id,text, по умолчанию все."""
+        names = [
+            name.strip()
+            for name in request.GET.get('fields', '').split(',')
+            if name.strip()
+        ]
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise ApiError(
+                f'Неизвестные поля: {", ".join(unknown)}. '
+                f'Доступны: {", ".join(self.fields)}'
+            )
+        return names or list(self.fields)
+
+    def values(self, queryset, names):
+        # Поля сортировки нужны курсору, даже если их не просили.
+        lookups = {self.fields[name] for name in names}
+        lookups.update(name.lstrip('-') for name in self.ordering)
+        return queryset.order_by(*self.ordering).values(*lookups)
+
+    def row(self, values, names, convert=None):
+        convert_fields = {**self.convert, **(convert or {})}
+        row = {}
+        for name in names:
+            value = values[self.fields[name]]
+            convert = convert_fields.get(name)
+            row[name] = value if convert is None else convert(value)
+        return row
+
+
+POSTS = Resource(
+    {
+        'id': 'id',
+        'text': 'text',
+        'pub_date': 'pub_date',
+        'author': 'author__username',
+        'group': 'group__slug',
+        'image': 'image',
+        'comments_count': 'comments_count',
+        'following': 'author_id',
+    },
+    ('-pub_date', '-id'),
+    {'image': media_url},
+)
+GROUPS = Resource(
+    {
+        'id': 'id',
+        'slug': 'slug',
+        'title': 'title',
+        'description': 'description',
+        'posts_count': 'posts_count',
+    },
+    ('id',),
+)
+PROFILES = Resource(
+    {
+        'username': 'username',
+        'first_name': 'first_name',
+        'last_name': 'last_name',
+        'posts_count': 'stats__posts_count',
+        'followers_count': 'stats__followers_count',
+        'following_count': 'stats__following_count',
+    },
+    ('id',),
+)
+COMMENTS = Resource(
+    {
+        'id': 'id',
+        'post': 'post_id',
+        'author': 'author__username',
+        'text': 'text',
+        'created': 'created',
+    },
+    ('created', 'id'),
+)
+
+
+def api_view(view):
+    """Ошибки отдаются в JSON, чтение идёт с реплики."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except Http404:
+            return JsonResponse({'detail': 'Не найдено'}, status=404)
+        except (ApiError, InvalidCursor) as error:
+            return JsonResponse({'detail': str(error)}, status=400)
+    return require_GET(read_from_replica(wrapper))
+
+
+def page_size(request):
+    try:
+        size = int(request.GET.get('limit', API_PAGE_SIZE))
+    except ValueError:
+        raise ApiError('limit должен быть числом')
+    return max(1, min(size, API_MAX_PAGE_SIZE))
+
+
+def page_link(request, cursor):
+    if cursor is None:
+        return None
+    query = request.GET.copy()
+    query['cursor'] = cursor
+    return f'{request.path}?{query.urlencode()}'
+
+
+def follow_state(request):
+    """Поле following постов: подписан ли посетитель на их авторов.
+
+    Множество подписок читается из кеша один раз на весь ответ.
+    """
+    user = request.user
+    followed = SimpleLazyObject(
+        lambda: following_ids(user.pk) if user.is_authenticated
+        else frozenset()
+    )
+    return {'following': lambda author_id: author_id in followed}
+
+
+def stream(resource, rows, names, convert):
+    """Вся выборка JSON-массивом, который собирается по ходу чтения."""
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    # Тело читается после выхода из view, когда read_from_replica уже
+    # вернул чтение на основную базу: выбираем базу сейчас.
+    rows = rows.using(rows.db)
+
+    def chunks():
+        yield '['
+        separator = '\n'
+        for values in rows.iterator(chunk_size=API_STREAM_CHUNK):
+            yield separator + encoder.encode(
+                resource.row(values, names, convert)
+            )
+            separator = ',\n'
+        yield '\n]\n'
+    return StreamingHttpResponse(chunks(), content_type='application/json')
+
+
+def listing(request, resource, queryset, convert=None):
+    names = resource.select(request)
+    rows = resource.values(queryset, names)
+    if request.GET.get('stream'):
+        return stream(resource, rows, names, convert)
+    paginator = CursorPaginator(rows, page_size(request), resource.ordering)
+    page = paginator.page(request.GET.get('cursor'))
+    return JsonResponse({
+        'results': [
+            resource.row(values, names, convert) for values in page
+        ],
+        'next': page_link(request, page.next_cursor),
+        'previous': page_link(request, page.previous_cursor),
+    }, json_dumps_params={'ensure_ascii': False})
+
+
+def detail(request, resource, queryset, convert=None):
+    names = resource.select(request)
+    try:
+        values = resource.values(queryset, names).get()
+    except queryset.model.DoesNotExist:
+        raise Http404
+    return JsonResponse(
+        resource.row(values, names, convert),
+        json_dumps_params={'ensure_ascii': False},
+    )
+
+
+@api_view
+def posts(request):
+    return listing(
+        request, POSTS, Post.objects.all(), follow_state(request)
+    )
+
+
+@api_view
+def post(request, post_id):
+    return detail(
+        request, POSTS, Post.objects.filter(pk=post_id),
+        follow_state(request),
+    )
+
+
+@api_view
+def comments(request, post_id):
+    get_object_or_404(Post.objects.only('id'), pk=post_id)
+    return listing(request, COMMENTS, Comment.objects.filter(post=post_id))
+
+
+@api_view
+def groups(request):
+    return listing(request, GROUPS, Group.objects.all())
+
+
+@api_view
+def group(request, slug):
+    return detail(request, GROUPS, Group.objects.filter(slug=slug))
+
+
+@api_view
+def group_posts(request, slug):
+    group = get_object_or_404(Group.objects.only('id'), slug=slug)
+    return listing(
+        request, POSTS, Post.objects.filter(group=group),
+        follow_state(request),
+    )
+
+
+@api_view
+def profile(request, username):
+    return detail(request, PROFILES, User.objects.filter(username=username))
+
+
+@api_view
+def profile_posts(request, username):
+    author = get_object_or_404(User.objects.only('id'), username=username)
+    return listing(
+        request, POSTS, Post.objects.filter(author=author),
+        follow_state(request),
+    )
+
+
+@api_view
+def follow(request):
+    if not request.user.is_authenticated:
+        return JsonResponse({'detail': 'Нужно войти на сайт'}, status=401)
+    return listing(
+        request, POSTS, timeline_queryset(request.user),
+        follow_state(request),
+    )
@@ -0,0 +1,278 @@
+"""Нагрузочный прогон всех маршрутов posts на сгенерированных данных."""
+import math
+import random
+import re
+import time
+from collections import Counter, namedtuple
+from urllib.parse import urlencode
+
+import requests
+from django.conf import settings
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+from faker import Faker
+from mixer.backend.django import mixer
+
+from . import urls
+from .models import Comment, Follow, Group, Post, User
+
+QUERIES = re.compile(r'"(\d+) queries"')
+
+Dataset = namedtuple('Dataset', 'author reader group post word')
+Scenario = namedtuple('Scenario', 'name method path user data prepare')
+
+
+def seed(users, groups, posts, comments, follows, random_seed=None):
+    """Заполняет базу через модели, чтобы сработали все сигналы."""
+    rnd = random.Random(random_seed)
+    fake = Faker('ru_RU')
+    fake.seed_instance(random_seed)
+    people = mixer.cycle(users).blend(
+        User, username=mixer.sequence('bench_user_{0}')
+    )
+    communities = mixer.cycle(groups).blend(
+        Group,
+        title=(fake.sentence(nb_words=3)[:200] for _ in range(groups)),
+        slug=mixer.sequence('bench-group-{0}'),
+        description=(fake.text() for _ in range(groups)),
+    )
+    entries = mixer.cycle(posts).blend(
+        Post,
+        author=(rnd.choice(people) for _ in range(posts)),
+        group=(rnd.choice(communities + [None]) for _ in range(posts)),
+        text=(fake.text() for _ in range(posts)),
+        image='',
+    )
+    if comments:
+        mixer.cycle(comments).blend(
+            Comment,
+            post=(rnd.choice(entries) for _ in range(comments)),
+            author=(rnd.choice(people) for _ in range(comments)),
+            text=(fake.sentence() for _ in range(comments)),
+        )
+    pairs = set()
+    limit = min(follows, len(people) * (len(people) - 1))
+    while len(pairs) < limit:
+        user, author = rnd.sample(people, 2)
+        pairs.add((user, author))
+    for user, author in pairs:
+        Follow.objects.create(user=user, author=author)
+    return dataset()
+
+
+def dataset():
+    """Самые нагруженные объекты базы, на которых меряются маршруты."""
+    author = User.objects.annotate(total=Count('posts')).order_by(
+        '-total', 'pk'
+    ).first()
+    reader = User.objects.exclude(pk=author.pk).annotate(
+        total=Count('follower')
+    ).order_by('-total', 'pk').first()
+    group = Group.objects.annotate(total=Count('posts')).order_by(
+        '-total', 'pk'
+    ).first()
+    post = Post.objects.filter(author=author).annotate(
+        total=Count('comments')
+    ).order_by('-total', '-pk').first()
+    words = [word for word in post.text.split() if len(word) > 3]
+    return Dataset(author, reader, group, post, (words or ['текст'])[0])
+
+
+def scenarios(data):
+    """По сценарию на каждый именованный маршрут posts/urls.py."""
+    author, reader = data.author, data.reader
+    following = {'user': reader, 'author': author}
+    found = [
+        Scenario('index', 'get', reverse('posts:index'), None, None, None),
+        Scenario(
+            'group', 'get', reverse('posts:group', args=[data.group.slug]),
+            None, None, None,
+        ),
+        Scenario(
+            'profile', 'get',
+            reverse('posts:profile', args=[author.username]),
+            reader, None, None,
+        ),
+        Scenario(
+            'search', 'get',
+            reverse('posts:search') + '?' + urlencode({'q': data.word}),
+            None, None, None,
+        ),
+        Scenario(
+            'post_detail', 'get',
+            reverse('posts:post_detail', args=[data.post.pk]),
+            None, None, None,
+        ),
+        Scenario(
+            'comments', 'get',
+            reverse('posts:comments', args=[data.post.pk]),
+            None, None, None,
+        ),
+        Scenario(
+            'post_create', 'post', reverse('posts:post_create'), author,
+            {'text': 'Новая запись', 'group': data.group.pk}, None,
+        ),
+        Scenario(
+            'post_edit', 'get',
+            reverse('posts:post_edit', args=[data.post.pk]),
+            author, None, None,
+        ),
+        Scenario(
+            'add_comment', 'post',
+            reverse('posts:add_comment', args=[data.post.pk]),
+            reader, {'text': 'Комментарий'}, None,
+        ),
+        Scenario(
+            'follow_index', 'get', reverse('posts:follow_index'),
+            reader, None, None,
+        ),
+        Scenario(
+            'profile_follow', 'get',
+            reverse('posts:profile_follow', args=[author.username]),
+            reader, None,
+            lambda: Follow.objects.filter(**following).delete(),
+        ),
+        Scenario(
+            'profile_unfollow', 'get',
+            reverse('posts:profile_unfollow', args=[author.username]),
+            reader, None,
+            lambda: Follow.objects.get_or_create(**following),
+        ),
+    ]
+    names = {pattern.name for pattern in urls.urlpatterns}
+    missing = names - {scenario.name for scenario in found}
+    if missing:
+        raise LookupError(
+            f'Нет сценария для маршрутов: {", ".join(sorted(missing))}'
+        )
+    return found
+
+
+def count_queries(response):
+    """Число запросов к базе из заголовка Server-Timing."""
+    match = QUERIES.search(response.get('Server-Timing', ''))
+    return int(match.group(1)) if match else None
+
+
+class ClientTransport:
+    """Запросы через тестовый клиент Django, без сети."""
+
+    def __init__(self):
+        self.clients = {}
+
+    def client(self, user):
+        if user not in self.clients:
+            client = Client()
+            if user is not None:
+                client.force_login(user)
+            self.clients[user] = client
+        return self.clients[user]
+
+    def request(self, scenario):
+        client = self.client(scenario.user)
+        response = getattr(client, scenario.method)(
+            scenario.path, scenario.data or {}
+        )
+        return (
+            response.status_code, len(response.content),
+            count_queries(response),
+        )
+
+
+class ServerTransport(ClientTransport):
+    """Запросы по HTTP к WSGI-серверу, запущенному в этом же процессе."""
+
+    def __init__(self, live_server_url):
+        super().__init__()
+        self.url = live_server_url
+        self.cookies = {}
+
+    def user_cookies(self, user):
+        if user not in self.cookies:
+            cookies = {
+                name: morsel.value
+                for name, morsel in self.client(user).cookies.items()
+            }
+            response = requests.get(
+                self.url + reverse('posts:post_create'),
+                cookies=cookies, allow_redirects=False,
+            )
+            cookies.update(response.cookies.get_dict())
+            self.cookies[user] = cookies
+        return self.cookies[user]
+
+    def request(self, scenario):
+        cookies = self.user_cookies(scenario.user)
+        response = requests.request(
+            scenario.method,
+            self.url + scenario.path,
+            data=scenario.data,
+            cookies=cookies,
+            headers={
+                'X-CSRFToken': cookies.get(settings.CSRF_COOKIE_NAME, ''),
+            },
+            allow_redirects=False,
+        )
+        return (
+            response.status_code, len(response.content),
+            count_queries(response.headers),
+        )
+
+
+def percentile(values, percent):
+    """Перцентиль по методу ближайшего ранга."""
+    ordered = sorted(values)
+    rank = math.ceil(percent / 100 * len(ordered))
+    return ordered[max(rank - 1, 0)]
+
+
+def measure(transport, scenario, count, warmup=1):
+    """Время, запросы к базе и размер ответа для одного маршрута.
+
+    Запросы к базе считает core.middleware.InstrumentationMiddleware.
+    """
+    for _ in range(warmup):
+        if scenario.prepare:
+            scenario.prepare()
+        transport.request(scenario)
+    timings, queries, sizes, statuses = [], [], [], Counter()
+    for _ in range(count):
+        if scenario.prepare:
+            scenario.prepare()
+        started = time.perf_counter()
+        status, size, query_count = transport.request(scenario)
+        timings.append((time.perf_counter() - started) * 1000)
+        queries.append(query_count or 0)
+        sizes.append(size)
+        statuses[str(status)] += 1
+    return {
+        'method': scenario.method.upper(),
+        'path': scenario.path,
+        'status': dict(statuses),
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'mean_ms': round(sum(timings) / len(timings), 3),
+        'queries': round(sum(queries) / len(queries), 2),
+        'bytes': round(sum(sizes) / len(sizes)),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Маршруты, которые стали медленнее порога или делают больше запросов."""
+    regressions = []
+    for name, current in results['routes'].items():
+        previous = baseline.get('routes', {}).get(name)
+        if previous is None:
+            continue
+        if current['p95_ms'] > previous['p95_ms'] * (1 + threshold):
+            regressions.append(
+                f'{name}: p95 {previous["p95_ms"]} -> {current["p95_ms"]} мс'
+            )
+        if current['queries'] > previous['queries']:
+            regressions.append(
+                f'{name}: запросов {previous["queries"]} -> '
+                f'{current["queries"]}'
+            )
+    return regressions
@@ -0,0 +1,57 @@
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+
+from .settings import POST_COUNT_CACHE_TIMEOUT
+
+ALL_POSTS = 'all'
+COUNT_KEY = 'posts:count:{}'
+
+
+def group_scope(group_id):
+    return f'group:{group_id}'
+
+
+def author_scope(author_id):
+    return f'author:{author_id}'
+
+
+def post_scopes(group_id, author_id):
+    """Области подсчёта, в которые попадает пост."""
+    scopes = [ALL_POSTS, author_scope(author_id)]
+    if group_id is not None:
+        scopes.append(group_scope(group_id))
+    return scopes
+
+
+def get_count(scope, objects):
+    """Число постов в области: из кэша, а при холодном кэше — COUNT(*)."""
+    key = COUNT_KEY.format(scope)
+    count = cache.get(key)
+    if count is None:
+        count = objects.count()
+        cache.add(key, count, POST_COUNT_CACHE_TIMEOUT)
+    return count
+
+
+def change_count(scopes, delta):
+    for scope in scopes:
+        try:
+            cache.incr(COUNT_KEY.format(scope), delta)
+        except ValueError:
+            # Ключа нет — значение посчитается при следующем чтении.
+            pass
+
+
+class CountedPaginator(Paginator):
+    """Paginator, который берёт число объектов у счётчика области."""
+
+    def __init__(self, object_list, per_page, scope=None):
+        super().__init__(object_list, per_page)
+        self.scope = scope
+
+    @cached_property
+    def count(self):
+        if self.scope is None:
+            return super().count
+        return get_count(self.scope, self.object_list)
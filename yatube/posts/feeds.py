@@ -0,0 +1,113 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from core.db import routers
+
+from .models import Post
+from .settings import FEED_CACHE_TIMEOUT
+
+# Колонки, которые читают шаблоны лент.
+FEED_FIELDS = (
+    'id',
+    'text',
+    'pub_date',
+    'image',
+    'comments_count',
+    'author',
+    'group',
+    'author__username',
+    'author__first_name',
+    'author__last_name',
+    'group__slug',
+    'group__title',
+)
+FEED_VERSION_KEY = 'posts:feed-version:{}'
+# Меняется при правке групп: их названия выводятся во всех лентах.
+ALL_GROUPS = 'groups'
+
+
+def follow_scope(user_id):
+    return f'follow:{user_id}'
+
+
+def feed_queryset(**filters):
+    """Посты для ленты вместе с автором и группой одним запросом."""
+    return Post.objects.filter(**filters).select_related(
+        'author', 'group'
+    ).only(*FEED_FIELDS)
+
+
+def feed_versions(scopes):
+    """Текущие версии областей; новая область получает текущее время."""
+    keys = [FEED_VERSION_KEY.format(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns() // 1000, None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_versions(keys):
+    now = time.time_ns() // 1000
+    versions = cache.get_many(keys)
+    cache.set_many(
+        {key: max(now, versions.get(key, 0) + 1) for key in keys}, None
+    )
+
+
+def bump_feed_versions(scopes):
+    """Сбрасывает закэшированные страницы лент областей.
+
+    Сбрасывает и ещё раз после фиксации транзакции: до неё соседний
+    запрос мог закэшировать старые строки уже под новой версией.
+    """
+    keys = [FEED_VERSION_KEY.format(scope) for scope in scopes]
+    bump_versions(keys)
+    transaction.on_commit(lambda: bump_versions(keys))
+
+
+def feed_modified(versions):
+    """Время последнего изменения областей в секундах.
+
+    Версия области — время её последнего сброса в микросекундах.
+    """
+    return max(versions) / 10 ** 6
+
+
+def replica_may_lag(versions):
+    """Читаем с реплики, а области менялись совсем недавно.
+
+    Реплика может ещё не знать об этих изменениях, поэтому страницу
+    нельзя кешировать и отдавать с ETag под новыми версиями: старые
+    строки застряли бы в общем кеше до следующего сброса.
+    """
+    return routers.reading_replica() and (
+        time.time() - feed_modified(versions) < settings.REPLICA_PIN_SECONDS
+    )
+
+
+def feed_cache_context(request, *scopes):
+    """Ключ фрагмента ленты: версии областей, страница и вход на сайт.
+
+    Ключ без версий адресует прежний вариант той же страницы, который
+    отдаётся, пока новый пересчитывает другой запрос. Пока реплика
+    может отставать, фрагмент не кешируется: feed_cacheable ложно.
+    """
+    versions = feed_versions([*scopes, ALL_GROUPS])
+    cacheable = not replica_may_lag(versions)
+    page = [
+        request.GET.get('page', ''),
+        request.GET.get('cursor', ''),
+        str(request.user.is_authenticated),
+    ]
+    return {
+        'feed_cache_key': ':'.join([*scopes, *map(str, versions), *page]),
+        'feed_stale_key': ':'.join([*scopes, *page]),
+        'feed_cache_timeout': FEED_CACHE_TIMEOUT if cacheable else 0,
+        'feed_cacheable': cacheable,
+        'feed_modified': feed_modified(versions),
+    }
@@ -0,0 +1,94 @@
+"""Граф подписок: закэшированные множества авторов и подписчиков.
+
+Множество пользователя читается одним запросом и дальше проверяется
+без обращений к базе. Записи Follow сбрасывают множества обоих
+участников, см. posts.signals.
+"""
+from django.core.cache import cache
+from django.db import connections, router, transaction
+from django.db.models.signals import post_save
+
+from .models import Follow
+from .settings import FOLLOW_CACHE_TIMEOUT
+
+FOLLOWING_KEY = 'posts:following:{}'
+FOLLOWERS_KEY = 'posts:followers:{}'
+
+
+def cached_ids(key, queryset, column):
+    ids = cache.get(key)
+    if ids is None:
+        ids = frozenset(queryset.values_list(column, flat=True))
+        cache.set(key, ids, FOLLOW_CACHE_TIMEOUT)
+    return ids
+
+
+def following_ids(user_id):
+    """Авторы, на которых подписан пользователь."""
+    return cached_ids(
+        FOLLOWING_KEY.format(user_id),
+        Follow.objects.filter(user_id=user_id),
+        'author_id',
+    )
+
+
+def follower_ids(author_id):
+    """Подписчики автора."""
+    return cached_ids(
+        FOLLOWERS_KEY.format(author_id),
+        Follow.objects.filter(author_id=author_id),
+        'user_id',
+    )
+
+
+def is_following(user, author):
+    return user.is_authenticated and author.pk in following_ids(user.pk)
+
+
+def invalidate(user_id, author_id):
+    keys = [FOLLOWING_KEY.format(user_id), FOLLOWERS_KEY.format(author_id)]
+    cache.delete_many(keys)
+    # До фиксации соседний запрос мог успеть закэшировать старое множество.
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def follow(user, author):
+    """Подписывает одним INSERT, пропускающим уже существующую строку.
+
+    Параллельные подписки не падают на unique_following: вставит
+    только одна, и только она разошлёт post_save для счётчиков и ленты.
+    Возвращает True, если подписка появилась.
+    """
+    using = router.db_for_write(Follow)
+    connection = connections[using]
+    ops = connection.ops
+    table = ops.quote_name(Follow._meta.db_table)
+    with connection.cursor() as cursor:
+        # INSERT OR IGNORE в SQLite и ON CONFLICT DO NOTHING в PostgreSQL.
+        # Без RETURNING, которого нет в SQLite до 3.35: вставку видно по
+        # rowcount, а id новой строки отдаёт last_insert_id.
+        cursor.execute(
+            f'{ops.insert_statement(ignore_conflicts=True)} {table} '
+            '(user_id, author_id) VALUES (%s, %s) '
+            f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}',
+            [user.pk, author.pk],
+        )
+        if cursor.rowcount != 1:
+            return False
+        pk = ops.last_insert_id(
+            cursor, Follow._meta.db_table, Follow._meta.pk.column
+        )
+    instance = Follow(pk=pk, user_id=user.pk, author_id=author.pk)
+    instance._state.adding = False
+    instance._state.db = using
+    post_save.send(
+        sender=Follow, instance=instance, created=True,
+        update_fields=None, raw=False, using=using,
+    )
+    return True
+
+
+def unfollow(user, author):
+    """Отписывает; возвращает False, если подписки не было."""
+    deleted, _ = Follow.objects.filter(user=user, author=author).delete()
+    return bool(deleted)
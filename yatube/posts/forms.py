@@ -1,6 +1,8 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 
 from .models import Post, Comment
+from .uploads import process_image
 
 
 class PostForm(forms.ModelForm):
@@ -8,6 +10,13 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('group', 'text', 'image')
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if not isinstance(image, UploadedFile):
+            return image
+        field = Post._meta.get_field('image')
+        return process_image(image, field.storage, field.upload_to)
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
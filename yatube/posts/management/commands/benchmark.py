@@ -0,0 +1,168 @@
+import json
+import platform
+import subprocess
+from datetime import datetime
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.testcases import LiveServerThread
+from django.test.utils import override_settings
+
+from posts import benchmark
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def private_caches():
+    """Кеши прогона: устроены как у сайта, но живут в памяти процесса.
+
+    Общий кеш сайта не должен ни очищаться замером, ни получать ленты и
+    счётчики тестовых постов.
+    """
+    caches = {}
+    for alias, config in settings.CACHES.items():
+        if config['BACKEND'] == 'core.cache.TwoLevelCache':
+            caches[alias] = config
+        else:
+            caches[alias] = {
+                'BACKEND': 'core.cache.LocMemCache',
+                'LOCATION': f'benchmark-{alias}',
+                'OPTIONS': {'MAX_ENTRIES': 100000},
+            }
+    return caches
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогоняет все маршруты posts на сгенерированных данных во '
+        'временной базе и сохраняет задержки, число запросов и размер '
+        'ответов в JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--groups', type=int, default=5)
+        parser.add_argument('--posts', type=int, default=500)
+        parser.add_argument('--comments', type=int, default=1000)
+        parser.add_argument('--follows', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--requests', type=int, default=50,
+            help='Запросов на маршрут',
+        )
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument(
+            '--server', action='store_true',
+            help='Ходить по HTTP в WSGI-сервер вместо тестового клиента',
+        )
+        parser.add_argument('-o', '--output', help='Куда сохранить JSON')
+        parser.add_argument(
+            '--compare', help='JSON прошлого прогона для сравнения'
+        )
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help='Допустимый рост p95, доля от прошлого значения',
+        )
+
+    def handle(self, *args, **options):
+        if options['users'] < 2 or options['posts'] < 1 or (
+            options['groups'] < 1
+        ):
+            raise CommandError(
+                'Нужны хотя бы два пользователя, одна группа и одна запись'
+            )
+        baseline = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as source:
+                baseline = json.load(source)
+        connection = connections[DEFAULT_DB_ALIAS]
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            with override_settings(
+                ALLOWED_HOSTS=['*'], CACHES=private_caches()
+            ):
+                results = self.run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+        self.report(results)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(results, output, ensure_ascii=False, indent=2)
+        if baseline is not None:
+            regressions = benchmark.compare(
+                results, baseline, options['threshold']
+            )
+            if regressions:
+                raise CommandError(
+                    'Регрессии:\n' + '\n'.join(regressions)
+                )
+            self.stdout.write(self.style.SUCCESS('Регрессий нет'))
+
+    def run(self, options):
+        dataset = {
+            name: options[name]
+            for name in ('users', 'groups', 'posts', 'comments', 'follows')
+        }
+        data = benchmark.seed(**dataset, random_seed=options['seed'])
+        try:
+            scenarios = benchmark.scenarios(data)
+        except LookupError as error:
+            raise CommandError(error)
+        server = None
+        if options['server']:
+            server = LiveServerThread('127.0.0.1', lambda handler: handler)
+            server.daemon = True
+            server.start()
+            server.is_ready.wait()
+            if server.error:
+                raise CommandError(server.error)
+            transport = benchmark.ServerTransport(
+                f'http://{server.host}:{server.port}'
+            )
+        else:
+            transport = benchmark.ClientTransport()
+        try:
+            routes = {
+                scenario.name: benchmark.measure(
+                    transport, scenario, options['requests'],
+                    options['warmup'],
+                )
+                for scenario in scenarios
+            }
+        finally:
+            if server is not None:
+                server.terminate()
+        return {
+            'commit': git_commit(),
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connections[DEFAULT_DB_ALIAS].vendor,
+            'transport': 'server' if options['server'] else 'client',
+            'requests': options['requests'],
+            'dataset': {**dataset, 'seed': options['seed']},
+            'routes': routes,
+        }
+
+    def report(self, results):
+        self.stdout.write(
+            f'{"маршрут":<18}{"p50":>9}{"p95":>9}{"p99":>9}'
+            f'{"запросы":>9}{"байты":>9}'
+        )
+        for name, route in results['routes'].items():
+            self.stdout.write(
+                f'{name:<18}{route["p50_ms"]:>9.2f}{route["p95_ms"]:>9.2f}'
+                f'{route["p99_ms"]:>9.2f}{route["queries"]:>9}'
+                f'{route["bytes"]:>9}'
+            )
@@ -0,0 +1,88 @@
+import datetime
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+
+from posts.models import Comment, Follow, Group, Post
+
+EXPORTS = (
+    ('group', Group.objects.order_by('pk'), {
+        'slug': 'slug',
+        'title': 'title',
+        'description': 'description',
+    }),
+    ('post', Post.objects.order_by('pk'), {
+        'text': 'text',
+        'pub_date': 'pub_date',
+        'image': 'image',
+        'author': 'author__username',
+        'group': 'group__slug',
+    }),
+    # Пост комментария задан его естественным ключом: id в другой базе
+    # будут другими.
+    ('comment', Comment.objects.order_by('pk'), {
+        'post_author': 'post__author__username',
+        'post_pub_date': 'post__pub_date',
+        'author': 'author__username',
+        'text': 'text',
+        'created': 'created',
+    }),
+    ('follow', Follow.objects.order_by('pk'), {
+        'user': 'user__username',
+        'author': 'author__username',
+    }),
+)
+
+
+class Encoder(DjangoJSONEncoder):
+    """Время с микросекундами: по нему импорт узнаёт загруженные строки.
+
+    DjangoJSONEncoder обрезает его до миллисекунд.
+    """
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class Command(BaseCommand):
+    help = 'Выгружает группы, посты, комментарии и подписки в NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-o', '--output', help='Файл выгрузки, по умолчанию stdout'
+        )
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        output = (
+            open(options['output'], 'w', encoding='utf-8')
+            if options['output'] else sys.stdout
+        )
+        started = time.monotonic()
+        total = 0
+        try:
+            for model, queryset, fields in EXPORTS:
+                rows = queryset.values_list(*fields.values()).iterator(
+                    chunk_size=options['chunk_size']
+                )
+                for row in rows:
+                    record = {'model': model, **dict(zip(fields, row))}
+                    output.write(
+                        json.dumps(
+                            record, cls=Encoder, ensure_ascii=False
+                        ) + '\n'
+                    )
+                    total += 1
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        elapsed = time.monotonic() - started
+        self.stderr.write(
+            f'Выгружено строк: {total}, '
+            f'{total / max(elapsed, 1e-6):.0f} строк/с'
+        )
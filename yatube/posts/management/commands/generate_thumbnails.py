@@ -0,0 +1,40 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import default
+
+from posts.models import Post
+from posts.settings import THUMBNAIL_WORKERS
+from posts.thumbnails import VARIANTS
+
+
+class Command(BaseCommand):
+    help = 'Создаёт недостающие миниатюры для картинок постов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=THUMBNAIL_WORKERS,
+            help='Число потоков нарезки',
+        )
+
+    def handle(self, *args, **options):
+        images = Post.objects.exclude(image='').values_list(
+            'image', flat=True
+        ).distinct()
+        jobs = [
+            (name, geometry_string, thumbnail_options)
+            for name in images.iterator()
+            for geometry_string, thumbnail_options in VARIANTS
+        ]
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            for _ in pool.map(lambda job: self.generate(*job), jobs):
+                pass
+        self.stdout.write(
+            self.style.SUCCESS(f'Обработано миниатюр: {len(jobs)}')
+        )
+
+    def generate(self, name, geometry_string, options):
+        try:
+            default.backend.generate(name, geometry_string, **options)
+        except Exception as error:
+            self.stderr.write(f'{name}: {error}')
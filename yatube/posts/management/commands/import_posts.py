@@ -0,0 +1,263 @@
+import json
+import os
+import time
+from itertools import islice
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from django.utils.dateparse import parse_datetime
+
+from posts.models import Comment, Follow, Group, Post, User
+from posts.timeline import rebuild
+
+
+def create(model, objs, date_field, batch_size):
+    """bulk_create и даты из выгрузки вместо проставленных auto_now_add."""
+    if not objs:
+        return
+    dates = [getattr(obj, date_field) for obj in objs]
+    last = model.objects.aggregate(last=Max('pk'))['last'] or 0
+    model.objects.bulk_create(objs, batch_size=batch_size)
+    if any(obj.pk is None for obj in objs):
+        # SQLite не возвращает id из bulk_create. Пачка пишется в
+        # транзакции с блокировкой на запись, так что её строки идут
+        # подряд сразу за last.
+        pks = model.objects.filter(pk__gt=last).order_by('pk').values_list(
+            'pk', flat=True
+        )
+        for obj, pk in zip(objs, pks):
+            obj.pk = pk
+    for obj, date in zip(objs, dates):
+        setattr(obj, date_field, date)
+    model.objects.bulk_update(objs, [date_field], batch_size=batch_size)
+
+
+class Importer:
+    """Сопоставляет строки выгрузки с базой по естественным ключам.
+
+    Автор — по username, группа — по slug, пост — по автору и времени
+    публикации, комментарий — по посту, автору и времени. Уже
+    загруженные строки пропускаются, так что повторный запуск ничего
+    не дублирует.
+    """
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+
+    def user_ids(self, usernames):
+        usernames = set(usernames)
+        users = dict(
+            User.objects.filter(username__in=usernames).values_list(
+                'username', 'pk'
+            )
+        )
+        missing = usernames - set(users)
+        if missing:
+            User.objects.bulk_create(
+                [User(username=username) for username in missing],
+                ignore_conflicts=True,
+            )
+            users.update(
+                User.objects.filter(username__in=missing).values_list(
+                    'username', 'pk'
+                )
+            )
+        return users
+
+    def group_ids(self, slugs):
+        return dict(
+            Group.objects.filter(slug__in=set(slugs) - {None}).values_list(
+                'slug', 'pk'
+            )
+        )
+
+    def post_ids(self, keys):
+        """{(id автора, время публикации): id} для загруженных постов."""
+        keys = set(keys)
+        posts = Post.objects.filter(
+            author_id__in={author for author, _ in keys},
+            pub_date__in={pub_date for _, pub_date in keys},
+        ).values_list('author_id', 'pub_date', 'pk')
+        return {
+            (author, pub_date): pk
+            for author, pub_date, pk in posts
+            if (author, pub_date) in keys
+        }
+
+    def import_group(self, records):
+        Group.objects.bulk_create(
+            [
+                Group(
+                    slug=record['slug'],
+                    title=record['title'],
+                    description=record['description'],
+                )
+                for record in records
+            ],
+            ignore_conflicts=True,
+        )
+
+    def import_post(self, records):
+        users = self.user_ids(record['author'] for record in records)
+        groups = self.group_ids(record['group'] for record in records)
+        posts = {}
+        for record in records:
+            key = (users[record['author']], parse_datetime(record['pub_date']))
+            posts.setdefault(key, Post(
+                text=record['text'],
+                pub_date=key[1],
+                image=record['image'],
+                author_id=key[0],
+                group_id=groups.get(record['group']),
+            ))
+        existing = self.post_ids(posts)
+        create(
+            Post,
+            [post for key, post in posts.items() if key not in existing],
+            'pub_date',
+            self.batch_size,
+        )
+
+    def import_comment(self, records):
+        users = self.user_ids(
+            username
+            for record in records
+            for username in (record['author'], record['post_author'])
+        )
+        post_keys = [
+            (users[record['post_author']],
+             parse_datetime(record['post_pub_date']))
+            for record in records
+        ]
+        posts = self.post_ids(post_keys)
+        comments = {}
+        for record, post_key in zip(records, post_keys):
+            if post_key not in posts:
+                continue
+            key = (
+                posts[post_key],
+                users[record['author']],
+                parse_datetime(record['created']),
+            )
+            comments.setdefault(key, Comment(
+                post_id=key[0],
+                author_id=key[1],
+                text=record['text'],
+                created=key[2],
+            ))
+        existing = set(
+            Comment.objects.filter(
+                post_id__in={post for post, _, _ in comments},
+                created__in={created for _, _, created in comments},
+            ).values_list('post_id', 'author_id', 'created')
+        )
+        create(
+            Comment,
+            [
+                comment for key, comment in comments.items()
+                if key not in existing
+            ],
+            'created',
+            self.batch_size,
+        )
+
+    def import_follow(self, records):
+        users = self.user_ids(
+            username
+            for record in records
+            for username in (record['user'], record['author'])
+        )
+        Follow.objects.bulk_create(
+            [
+                Follow(
+                    user_id=users[record['user']],
+                    author_id=users[record['author']],
+                )
+                for record in records
+                if record['user'] != record['author']
+            ],
+            ignore_conflicts=True,
+        )
+
+    def write(self, records):
+        """Пишет пачку, разбивая её на подряд идущие записи одной модели."""
+        start = 0
+        for end in range(1, len(records) + 1):
+            if (end == len(records)
+                    or records[end]['model'] != records[start]['model']):
+                model = records[start]['model']
+                getattr(self, f'import_{model}')(records[start:end])
+                start = end
+
+
+def read_progress(path):
+    """Последняя записанная позиция: файл только дописывается."""
+    with open(path) as progress:
+        lines = progress.read().split()
+    return int(lines[-1]) if lines else 0
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает выгрузку export_posts. Повторный запуск продолжает '
+        'с места остановки и не дублирует уже загруженные строки; файлы '
+        'картинок переносятся отдельно.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='Файл NDJSON')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Начать сначала, не глядя на сохранённый прогресс',
+        )
+
+    def handle(self, *args, **options):
+        path = options['input']
+        progress_path = f'{path}.progress'
+        done = 0
+        if os.path.exists(progress_path):
+            if options['restart']:
+                os.remove(progress_path)
+            else:
+                done = read_progress(progress_path)
+                self.stderr.write(f'Продолжаем со строки {done + 1}')
+        importer = Importer(options['batch_size'])
+        started = time.monotonic()
+        imported = 0
+        with open(path, encoding='utf-8') as lines:
+            lines = islice(lines, done, None)
+            while True:
+                batch = list(islice(lines, options['batch_size']))
+                if not batch:
+                    break
+                try:
+                    records = [json.loads(line) for line in batch]
+                except ValueError as error:
+                    raise CommandError(
+                        f'Строка после {done}: {error}'
+                    ) from error
+                with transaction.atomic():
+                    importer.write(records)
+                done += len(batch)
+                imported += len(batch)
+                # Если упадём до записи позиции, пачка перечитается, но
+                # её строки уже в базе и будут пропущены.
+                with open(progress_path, 'a') as progress:
+                    progress.write(f'{done}\n')
+                elapsed = time.monotonic() - started
+                self.stderr.write(
+                    f'Строк: {done}, '
+                    f'{imported / max(elapsed, 1e-6):.0f} строк/с'
+                )
+        # bulk_create не отправляет сигналы: пересобираем производные данные.
+        call_command('recount_counters', stdout=self.stdout)
+        call_command('rebuild_search_index', stdout=self.stdout)
+        rebuild()
+        cache.clear()
+        if os.path.exists(progress_path):
+            os.remove(progress_path)
+        self.stdout.write(self.style.SUCCESS(f'Загружено строк: {done}'))
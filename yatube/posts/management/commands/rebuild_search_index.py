@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.models import Post
+from posts.search import get_index
+
+
+class Command(BaseCommand):
+    help = 'Заново строит поисковый индекс постов'
+
+    def handle(self, *args, **options):
+        index = get_index()
+        with transaction.atomic():
+            index.clear()
+            for post in Post.objects.only('pk', 'text').iterator():
+                index.update(post)
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано постов: {Post.objects.count()}'
+        ))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from posts.models import Comment, Follow, Group, Post, User, UserStats
+
+
+def count_of(queryset, field):
+    """Подзапрос: сколько строк queryset ссылается на внешнюю запись."""
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef('pk')}).order_by().values(
+                field
+            ).annotate(total=Count('pk')).values('total'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики записей, комментариев и подписок'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            UserStats.objects.bulk_create(
+                [
+                    UserStats(user_id=pk)
+                    for pk in User.objects.filter(
+                        stats__isnull=True
+                    ).values_list('pk', flat=True)
+                ],
+                batch_size=500,
+                ignore_conflicts=True,
+            )
+            Post.objects.update(
+                comments_count=count_of(Comment.objects, 'post')
+            )
+            Group.objects.update(posts_count=count_of(Post.objects, 'group'))
+            UserStats.objects.update(
+                posts_count=count_of(Post.objects, 'author'),
+                followers_count=count_of(Follow.objects, 'author'),
+                following_count=count_of(Follow.objects, 'user'),
+            )
+        self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны'))
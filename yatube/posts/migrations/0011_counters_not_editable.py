@@ -0,0 +1,38 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='group',
+            name='posts_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Записей'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='comments_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Комментариев'),
+        ),
+        migrations.AlterField(
+            model_name='userstats',
+            name='followers_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Подписчиков'),
+        ),
+        migrations.AlterField(
+            model_name='userstats',
+            name='following_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Подписок'),
+        ),
+        migrations.AlterField(
+            model_name='userstats',
+            name='posts_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Записей'),
+        ),
+    ]
@@ -9,6 +9,9 @@ class Group(models.Model):
     title = models.CharField(max_length=200, verbose_name='Заголовок')
     slug = models.SlugField(unique=True, verbose_name='Идентификатор')
     description = models.TextField(verbose_name='Описание')
+    posts_count = models.IntegerField(
+        default=0, editable=False, verbose_name='Записей'
+    )
 
     class Meta:
         verbose_name = 'Группа'
@@ -47,9 +50,24 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    comments_count = models.IntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Комментариев'
+    )
 
     class Meta:
         ordering = ('-pub_date',)
+        # Ленты группы и автора фильтруют по одному полю и сортируют по
+        # дате, так что сортировка берётся прямо из индекса.
+        indexes = [
+            models.Index(
+                fields=['group', 'pub_date'], name='post_group_date_idx'
+            ),
+            models.Index(
+                fields=['author', 'pub_date'], name='post_author_date_idx'
+            ),
+        ]
         verbose_name = 'Запись'
         verbose_name_plural = 'Записи'
 
@@ -72,6 +90,13 @@ class Comment(models.Model):
     text = models.TextField(verbose_name='Текст')
     created = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['post', 'created'], name='comment_post_created_idx'
+            ),
+        ]
+
     def __str__(self):
         return self.text
 
@@ -94,3 +119,78 @@ class Follow(models.Model):
                 fields=['user', 'author'],
                 name='unique_following')
         ]
+        # Подписчики автора; подписки пользователя покрывает
+        # unique_following.
+        indexes = [
+            models.Index(
+                fields=['author', 'user'], name='follow_author_user_idx'
+            ),
+        ]
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь',
+    )
+    posts_count = models.IntegerField(
+        default=0, editable=False, verbose_name='Записей'
+    )
+    followers_count = models.IntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Подписчиков'
+    )
+    following_count = models.IntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Подписок'
+    )
+
+    class Meta:
+        verbose_name = 'Статистика пользователя'
+        verbose_name_plural = 'Статистика пользователей'
+
+    def __str__(self):
+        return str(self.user)
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+    )
+    # Копия Post.pub_date, чтобы лента сортировалась по своему индексу.
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entry')
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date'],
+                name='timeline_user_date_idx')
+        ]
+
+
+class PostSearchTerm(models.Model):
+    """Обратный индекс поиска, если база не умеет FTS5."""
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='search_terms',
+    )
+    term = models.CharField(max_length=100, db_index=True)
+    weight = models.IntegerField(default=1)
@@ -0,0 +1,147 @@
+import base64
+import binascii
+import json
+from types import SimpleNamespace
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage, Page, Paginator
+from django.db.models import Q
+
+
+class InvalidCursor(InvalidPage):
+    pass
+
+
+class CursorPage(Page):
+    """Страница, которая знает только соседей, но не свой номер.
+
+    Как и у Paginator.page, запрос выполняется при первом обращении к
+    строкам или соседям, а не при создании: закэшированный фрагмент
+    ленты выводится без обращения к базе.
+    """
+
+    def __init__(self, objects, paginator, values=None, backwards=False):
+        self.objects = objects
+        self.paginator = paginator
+        self.number = None
+        self.values = values
+        self.backwards = backwards
+        self._loaded = None
+
+    def __repr__(self):
+        return '<Cursor page>'
+
+    def load(self):
+        if self._loaded is not None:
+            return self._loaded
+        paginator = self.paginator
+        rows = list(self.objects[:paginator.per_page + 1])
+        has_more = len(rows) > paginator.per_page
+        rows = rows[:paginator.per_page]
+        if self.backwards:
+            rows.reverse()
+            has_next, has_previous = bool(rows), has_more
+        else:
+            has_next, has_previous = has_more, bool(self.values and rows)
+        self._loaded = (
+            rows,
+            paginator.encode_cursor(rows[-1]) if has_next else None,
+            paginator.encode_cursor(rows[0], backwards=True)
+            if has_previous else None,
+        )
+        return self._loaded
+
+    @property
+    def object_list(self):
+        return self.load()[0]
+
+    @property
+    def next_cursor(self):
+        return self.load()[1]
+
+    @property
+    def previous_cursor(self):
+        return self.load()[2]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class CursorPaginator(Paginator):
+    """Keyset-пагинация: страница ищется по индексу от позиции курсора.
+
+    Не выполняет ни COUNT(*), ни OFFSET, поэтому глубокие страницы
+    открываются так же быстро, как первая.
+    """
+
+    is_cursor = True
+
+    def __init__(self, object_list, per_page, ordering=('-pub_date', '-id')):
+        super().__init__(object_list, per_page)
+        self.ordering = ordering
+        self.fields = [
+            (name.lstrip('-'), name.startswith('-')) for name in ordering
+        ]
+
+    def encode_cursor(self, obj, backwards=False):
+        if isinstance(obj, dict):
+            # Строка из .values(): поля читаются как атрибуты.
+            obj = SimpleNamespace(**obj)
+        model_fields = self.object_list.model._meta
+        values = [
+            model_fields.get_field(name).value_to_string(obj)
+            for name, _ in self.fields
+        ]
+        data = json.dumps({'v': values, 'b': backwards}).encode()
+        return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        model_fields = self.object_list.model._meta
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            if len(data['v']) != len(self.fields):
+                raise ValueError
+            values = [
+                model_fields.get_field(name).to_python(value)
+                for (name, _), value in zip(self.fields, data['v'])
+            ]
+            if None in values:
+                raise ValueError
+            return values, bool(data.get('b'))
+        except (binascii.Error, KeyError, TypeError, ValueError,
+                ValidationError):
+            raise InvalidCursor('Некорректный курсор')
+
+    def seek_filter(self, values, backwards):
+        condition = Q()
+        equal = {}
+        for (name, descending), value in zip(self.fields, values):
+            lookup = 'lt' if descending != backwards else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+    def page(self, cursor):
+        values, backwards = (
+            self.decode_cursor(cursor) if cursor else (None, False)
+        )
+        ordering = self.ordering
+        if backwards:
+            ordering = [
+                name[1:] if name.startswith('-') else f'-{name}'
+                for name in ordering
+            ]
+        objects = self.object_list.order_by(*ordering)
+        if values is not None:
+            objects = objects.filter(self.seek_filter(values, backwards))
+        return CursorPage(objects, self, values, backwards)
+
+    def get_page(self, cursor):
+        try:
+            return self.page(cursor)
+        except InvalidPage:
+            return self.page(None)
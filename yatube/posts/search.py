@@ -0,0 +1,217 @@
+import re
+from collections import Counter
+from datetime import timedelta
+
+from django.db import connection
+from django.db.models import Case, Count, IntegerField, Sum, Value, When
+from django.utils import timezone
+
+from .feeds import feed_queryset
+from .models import Post, PostSearchTerm
+from .settings import SEARCH_MAX_RESULTS, SEARCH_RECENCY_DAYS
+
+WORD = re.compile(r'\w+')
+_index = None
+
+# Стеммер Портера для русского языка (Snowball), все суффиксы ищутся в RV.
+RV = re.compile(r'^(.*?[аеиоуыэюя])(.*)$')
+PERFECTIVE_GERUND = re.compile(
+    r'((ив|ивши|ившись|ыв|ывши|ывшись)|((?<=[ая])(в|вши|вшись)))$'
+)
+REFLEXIVE = re.compile(r'(с[яь])$')
+ADJECTIVE = re.compile(
+    r'(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых|'
+    r'ую|юю|ая|яя|ою|ею)$'
+)
+PARTICIPLE = re.compile(r'((ивш|ывш|ующ)|((?<=[ая])(ем|нн|вш|ющ|щ)))$')
+VERB = re.compile(
+    r'((ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|'
+    r'ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю)|'
+    r'((?<=[ая])(ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)))$'
+)
+NOUN = re.compile(
+    r'(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем|'
+    r'ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$'
+)
+DERIVATIONAL = re.compile(r'.*[^аеиоуыэюя]+[аеиоуыэюя].*ость?$')
+SUPERLATIVE = re.compile(r'(ейше|ейш)$')
+
+
+def stem(word):
+    match = RV.match(word)
+    if not match:
+        return word
+    start, rv = match.groups()
+    stemmed = PERFECTIVE_GERUND.sub('', rv, 1)
+    if stemmed == rv:
+        rv = REFLEXIVE.sub('', rv, 1)
+        stemmed = ADJECTIVE.sub('', rv, 1)
+        if stemmed != rv:
+            rv = PARTICIPLE.sub('', stemmed, 1)
+        else:
+            stemmed = VERB.sub('', rv, 1)
+            rv = NOUN.sub('', rv, 1) if stemmed == rv else stemmed
+    else:
+        rv = stemmed
+    rv = re.sub(r'и$', '', rv, 1)
+    if DERIVATIONAL.match(rv):
+        rv = re.sub(r'ость?$', '', rv, 1)
+    stemmed = re.sub(r'ь$', '', rv, 1)
+    if stemmed == rv:
+        rv = re.sub(r'нн$', 'н', SUPERLATIVE.sub('', rv, 1), 1)
+    else:
+        rv = stemmed
+    return start + rv
+
+
+def tokenize(text):
+    """Основы слов текста в нижнем регистре, ё приравнена к е."""
+    return [
+        stem(word) for word in WORD.findall(text.lower().replace('ё', 'е'))
+    ]
+
+
+class FTS5Index:
+    """Индекс в виртуальной таблице SQLite FTS5 с ранжированием bm25."""
+
+    table = 'posts_post_fts'
+
+    def update(self, post):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {self.table} WHERE rowid = %s', [post.pk]
+            )
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, body) VALUES (%s, %s)',
+                [post.pk, ' '.join(tokenize(post.text))],
+            )
+
+    def remove(self, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {self.table} WHERE rowid = %s', [post_id]
+            )
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+
+    @staticmethod
+    def match_query(terms):
+        return ' '.join(f'"{term}"' for term in terms)
+
+    def search(self, terms, limit):
+        query = self.match_query(terms)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid, -bm25({self.table}) FROM {self.table} '
+                f'WHERE {self.table} MATCH %s '
+                f'ORDER BY bm25({self.table}) LIMIT %s',
+                [query, limit],
+            )
+            return cursor.fetchall()
+
+    def filter(self, queryset, terms):
+        """Посты queryset, подходящие под все термы."""
+        # RawSQL в pk__in превратился бы в IN ((SELECT ...)), а такое
+        # условие SQLite проверяет только по первой строке подзапроса.
+        column = '.'.join(map(connection.ops.quote_name, (
+            queryset.model._meta.db_table, queryset.model._meta.pk.column
+        )))
+        return queryset.extra(
+            where=[
+                f'{column} IN (SELECT rowid FROM {self.table} '
+                f'WHERE {self.table} MATCH %s)'
+            ],
+            params=[self.match_query(terms)],
+        )
+
+
+class TermIndex:
+    """Обратный индекс в обычной таблице для остальных баз."""
+
+    def update(self, post):
+        self.remove(post.pk)
+        PostSearchTerm.objects.bulk_create([
+            PostSearchTerm(post_id=post.pk, term=term[:100], weight=weight)
+            for term, weight in Counter(tokenize(post.text)).items()
+        ])
+
+    def remove(self, post_id):
+        PostSearchTerm.objects.filter(post_id=post_id).delete()
+
+    def clear(self):
+        PostSearchTerm.objects.all().delete()
+
+    def matches(self, terms):
+        return PostSearchTerm.objects.filter(term__in=terms).values(
+            'post_id'
+        ).annotate(
+            score=Sum('weight'), matched=Count('term', distinct=True)
+        ).filter(matched=len(terms))
+
+    def search(self, terms, limit):
+        return self.matches(terms).order_by('-score').values_list(
+            'post_id', 'score'
+        )[:limit]
+
+    def filter(self, queryset, terms):
+        """Посты queryset, подходящие под все термы."""
+        return queryset.filter(pk__in=self.matches(terms).values('post_id'))
+
+
+def fts5_available():
+    if connection.vendor != 'sqlite':
+        return False
+    return FTS5Index.table in connection.introspection.table_names()
+
+
+def get_index():
+    global _index
+    if _index is None:
+        _index = FTS5Index() if fts5_available() else TermIndex()
+    return _index
+
+
+def rank(matches):
+    """Релевантность, которая вдвое слабее каждые SEARCH_RECENCY_DAYS."""
+    scores = dict(matches)
+    dates = Post.objects.filter(pk__in=scores).values_list('pk', 'pub_date')
+    now = timezone.now()
+    half_life = timedelta(days=SEARCH_RECENCY_DAYS)
+    ranked = {
+        pk: scores[pk] * 0.5 ** ((now - pub_date) / half_life)
+        for pk, pub_date in dates
+    }
+    return sorted(ranked, key=ranked.get, reverse=True)
+
+
+def search_ids(query):
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return []
+    return rank(get_index().search(terms, SEARCH_MAX_RESULTS))
+
+
+def filter_matching(queryset, query):
+    """Все посты queryset, подходящие под запрос, без ранжирования.
+
+    Для админки: в отличие от search_ids, выдача не обрезается до
+    SEARCH_MAX_RESULTS, а фильтр остаётся подзапросом.
+    """
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return queryset.none()
+    return get_index().filter(queryset, terms)
+
+
+def search_posts(query):
+    """Посты по запросу в порядке релевантности и свежести."""
+    ids = search_ids(query)
+    if not ids:
+        return feed_queryset().none()
+    return feed_queryset(pk__in=ids).order_by(Case(
+        *[When(pk=pk, then=Value(position))
+          for position, pk in enumerate(ids)],
+        output_field=IntegerField(),
+    ))
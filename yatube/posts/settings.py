@@ -1 +1,43 @@
 NUMBER_POSTS_ON_PAGE = 15
+# Сколько комментариев показывается под постом и подгружается за раз
+NUMBER_COMMENTS_ON_PAGE = 20
+# Размер страницы JSON API по умолчанию и наибольший размер для ?limit=
+API_PAGE_SIZE = 20
+API_MAX_PAGE_SIZE = 100
+# По сколько строк читается из базы выгрузка ?stream=1
+API_STREAM_CHUNK = 500
+# Сколько секунд живут счётчики постов, пока их не пересчитают заново
+POST_COUNT_CACHE_TIMEOUT = 60 * 60
+# Сколько секунд живут множества подписок и подписчиков в кеше
+FOLLOW_CACHE_TIMEOUT = 60 * 60
+# Страховочный срок жизни закэшированных лент: сбрасываются они по событиям
+FEED_CACHE_TIMEOUT = 60 * 10
+# Сколько последних записей хранится в ленте подписок пользователя
+TIMELINE_MAX_LENGTH = 800
+# Ленты подписчиков подрезаются в среднем раз в столько раскладок
+TIMELINE_TRIM_EVERY = 50
+# Посты авторов с таким числом подписчиков не раскладываются по лентам,
+# а подмешиваются при чтении
+TIMELINE_FANOUT_LIMIT = 1000
+# Ширины вариантов картинки поста для srcset: кадр везде 960x339
+THUMBNAIL_WIDTHS = (480, 768, 960, 1440)
+THUMBNAIL_SIZES = tuple(
+    (f'{width}x{round(width * 339 / 960)}', {'crop': 'center', 'upscale': True})
+    for width in THUMBNAIL_WIDTHS
+)
+# Вариант для src и атрибут sizes: на узких экранах картинка во всю ширину
+THUMBNAIL_DEFAULT_WIDTH = 960
+THUMBNAIL_SIZES_ATTR = '(max-width: 960px) 100vw, 960px'
+# Число фоновых потоков нарезки миниатюр
+THUMBNAIL_WORKERS = 2
+# Сколько самых релевантных постов ранжируется с учётом свежести
+SEARCH_MAX_RESULTS = 300
+# За столько дней вклад релевантности в ранг падает вдвое
+SEARCH_RECENCY_DAYS = 30
+# Загрузки картинок: наибольший файл, число пикселей до декодирования,
+# сторона после уменьшения, качество пересжатия и допустимые форматы
+IMAGE_MAX_UPLOAD = 20 * 2 ** 20
+IMAGE_MAX_PIXELS = 50_000_000
+IMAGE_MAX_SIDE = 1920
+IMAGE_QUALITY = 82
+IMAGE_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
@@ -0,0 +1,136 @@
+from django.db.models import F
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .counts import author_scope, change_count, group_scope, post_scopes
+from .feeds import ALL_GROUPS, bump_feed_versions, follow_scope
+from .follows import invalidate
+from .models import Comment, Follow, Group, Post, UserStats
+from .search import get_index
+from .timeline import backfill, fan_out, remove, unpull
+
+
+def change_counters(queryset, **deltas):
+    return queryset.update(
+        **{name: F(name) + delta for name, delta in deltas.items()}
+    )
+
+
+def change_user_stats(user_id, **deltas):
+    stats = UserStats.objects.filter(user_id=user_id)
+    if change_counters(stats, **deltas):
+        return
+    # Строку статистики заводим только при росте счётчиков: при удалении
+    # пользователя её уже может не быть.
+    if all(delta > 0 for delta in deltas.values()):
+        UserStats.objects.get_or_create(user_id=user_id)
+        change_counters(stats, **deltas)
+
+
+def change_group_posts(group_id, delta):
+    if group_id is not None:
+        change_counters(Group.objects.filter(pk=group_id), posts_count=delta)
+
+
+@receiver(post_init, sender=Post)
+def remember_post_group(sender, instance, **kwargs):
+    # Берём из __dict__, чтобы не дозапрашивать отложенные поля.
+    instance._saved_group_id = instance.__dict__.get('group_id')
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, **kwargs):
+    scopes = post_scopes(instance.group_id, instance.author_id)
+    if created:
+        change_count(scopes, 1)
+        change_group_posts(instance.group_id, 1)
+        change_user_stats(instance.author_id, posts_count=1)
+        fan_out(instance)
+    elif instance._saved_group_id != instance.group_id:
+        change_group_posts(instance._saved_group_id, -1)
+        change_group_posts(instance.group_id, 1)
+        if instance._saved_group_id is not None:
+            change_count([group_scope(instance._saved_group_id)], -1)
+            scopes.append(group_scope(instance._saved_group_id))
+        if instance.group_id is not None:
+            change_count([group_scope(instance.group_id)], 1)
+    bump_feed_versions(scopes)
+    instance._saved_group_id = instance.group_id
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    scopes = post_scopes(instance.group_id, instance.author_id)
+    change_count(scopes, -1)
+    change_group_posts(instance.group_id, -1)
+    change_user_stats(instance.author_id, posts_count=-1)
+    bump_feed_versions(scopes)
+
+
+@receiver(post_save, sender=Post)
+def index_saved_post(sender, instance, **kwargs):
+    get_index().update(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_deleted_post(sender, instance, **kwargs):
+    get_index().remove(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, **kwargs):
+    if created:
+        change_counters(
+            Post.objects.filter(pk=instance.post_id), comments_count=1
+        )
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    change_counters(
+        Post.objects.filter(pk=instance.post_id), comments_count=-1
+    )
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def refresh_commented_feeds(sender, instance, **kwargs):
+    post = Post.objects.filter(pk=instance.post_id).values(
+        'group_id', 'author_id'
+    ).first()
+    if post is not None:
+        bump_feed_versions(post_scopes(post['group_id'], post['author_id']))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def refresh_group_feeds(sender, instance, **kwargs):
+    bump_feed_versions([ALL_GROUPS, group_scope(instance.pk)])
+
+
+@receiver(post_save, sender=Follow)
+def count_saved_follow(sender, instance, created, **kwargs):
+    if created:
+        change_user_stats(instance.user_id, following_count=1)
+        change_user_stats(instance.author_id, followers_count=1)
+        backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    change_user_stats(instance.user_id, following_count=-1)
+    change_user_stats(instance.author_id, followers_count=-1)
+    remove(instance.user_id, instance.author_id)
+    unpull(instance.author_id)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def refresh_follow_feed(sender, instance, **kwargs):
+    invalidate(instance.user_id, instance.author_id)
+    # Профили обоих показывают число подписчиков и подписок.
+    bump_feed_versions([
+        follow_scope(instance.user_id),
+        author_scope(instance.user_id),
+        author_scope(instance.author_id),
+    ])
@@ -0,0 +1,75 @@
+from django import template
+from django.utils.html import format_html
+
+from ..settings import THUMBNAIL_DEFAULT_WIDTH, THUMBNAIL_SIZES_ATTR
+from ..thumbnails import lookup
+
+register = template.Library()
+
+# Ключ в render_context, где prefetch_images оставляет найденные варианты
+PREFETCHED = 'posts.responsive_images.prefetched'
+
+
+def srcset(files):
+    return ', '.join(f'{file.url} {file.x}w' for file in files)
+
+
+def render_image(image, variants, css_class):
+    """<img> со srcset готовых вариантов; WebP — в <picture> рядом."""
+    plain = sorted(
+        (file for options, file in variants if 'format' not in options),
+        key=lambda file: file.x,
+    )
+    webp = sorted(
+        (file for options, file in variants if 'format' in options),
+        key=lambda file: file.x,
+    )
+    if not plain:
+        # Миниатюры ещё режутся в фоне: пока показываем оригинал.
+        return format_html('<img class="{}" src="{}">', css_class, image.url)
+    src = next(
+        (file for file in plain if file.x >= THUMBNAIL_DEFAULT_WIDTH),
+        plain[-1],
+    )
+    html = format_html(
+        '<img class="{}" src="{}" srcset="{}" sizes="{}" width="{}" '
+        'height="{}" loading="lazy">',
+        css_class, src.url, srcset(plain), THUMBNAIL_SIZES_ATTR,
+        src.x, src.y,
+    )
+    if webp:
+        html = format_html(
+            '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+            '{}</picture>',
+            srcset(webp), THUMBNAIL_SIZES_ATTR, html,
+        )
+    return html
+
+
+@register.simple_tag(takes_context=True)
+def prefetch_images(context, posts):
+    """Ищет миниатюры всех картинок страницы одним чтением кеша.
+
+    {% prefetch_images page_obj %} ставится перед циклом по постам;
+    недостающие миниатюры уходят в очередь нарезки.
+    """
+    names = {post.image.name for post in posts if post.image}
+    prefetched = context.render_context.setdefault(PREFETCHED, {})
+    if names:
+        prefetched.update(lookup(names))
+    return ''
+
+
+@register.simple_tag(takes_context=True)
+def responsive_image(context, image, css_class=''):
+    """Картинка поста во всех ширинах из THUMBNAIL_SIZES.
+
+    Варианты берутся из prefetch_images, а без него все варианты одной
+    картинки ищутся одним чтением кеша.
+    """
+    if not image:
+        return ''
+    variants = context.render_context.get(PREFETCHED, {}).get(image.name)
+    if variants is None:
+        variants = lookup([image.name])[image.name]
+    return render_image(image, variants, css_class)
@@ -0,0 +1,106 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+
+from ..models import Comment, Follow, Group, Post, TimelineEntry, User
+
+
+class ImportExportTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        author = User.objects.create_user(username='author')
+        reader = User.objects.create_user(username='reader')
+        group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        self.post = Post.objects.create(
+            author=author, text='Текст', group=group
+        )
+        Post.objects.filter(pk=self.post.pk).update(
+            pub_date='2020-01-01T00:00:00Z'
+        )
+        Comment.objects.create(
+            post=self.post, author=reader, text='Комментарий'
+        )
+        Follow.objects.create(user=reader, author=author)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.dump = os.path.join(directory.name, 'dump.ndjson')
+
+    def test_round_trip(self):
+        """Выгрузка загружается в пустую базу без потерь."""
+        call_command('export_posts', output=self.dump, stderr=StringIO())
+        Follow.objects.all().delete()
+        Post.objects.all().delete()
+        Group.objects.all().delete()
+        User.objects.all().delete()
+        call_command(
+            'import_posts', self.dump, batch_size=2,
+            stdout=StringIO(), stderr=StringIO(),
+        )
+        post = Post.objects.get(text=self.post.text)
+        self.assertEqual(post.pub_date.year, 2020)
+        self.assertEqual(post.group.slug, 'group')
+        self.assertEqual(post.author.username, 'author')
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(post.author.stats.followers_count, 1)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user__username='reader', post=post
+        ).exists())
+        self.assertFalse(os.path.exists(f'{self.dump}.progress'))
+
+    def test_import_into_populated_db(self):
+        """Занятые id не мешают загрузке и не портят чужие строки."""
+        call_command('export_posts', output=self.dump, stderr=StringIO())
+        Post.objects.filter(pk=self.post.pk).update(
+            pub_date='2021-06-01T00:00:00Z'
+        )
+        call_command(
+            'import_posts', self.dump, stdout=StringIO(), stderr=StringIO()
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.pub_date.year, 2021)
+        self.assertEqual(self.post.comments.count(), 1)
+        imported = Post.objects.exclude(pk=self.post.pk).get()
+        self.assertEqual(imported.pub_date.year, 2020)
+        self.assertEqual(imported.comments.get().text, 'Комментарий')
+
+    def test_resume_skips_committed_lines(self):
+        call_command('export_posts', output=self.dump, stderr=StringIO())
+        with open(f'{self.dump}.progress', 'w') as progress:
+            progress.write('1')
+        Group.objects.all().delete()
+        call_command(
+            'import_posts', self.dump, stdout=StringIO(), stderr=StringIO()
+        )
+        self.assertFalse(Group.objects.exists())
+
+    def test_repeated_import_adds_nothing(self):
+        """Повторная загрузка, в том числе с --restart, не дублирует строки."""
+        call_command('export_posts', output=self.dump, stderr=StringIO())
+        for options in ({}, {}, {'restart': True}):
+            call_command(
+                'import_posts', self.dump, batch_size=2,
+                stdout=StringIO(), stderr=StringIO(), **options,
+            )
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertEqual(Follow.objects.count(), 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+
+    def test_resume_reads_last_checkpoint(self):
+        """Позиция дописывается в файл, продолжение берёт последнюю."""
+        call_command('export_posts', output=self.dump, stderr=StringIO())
+        with open(f'{self.dump}.progress', 'w') as progress:
+            progress.write('1\n2\n')
+        Post.objects.all().delete()
+        call_command(
+            'import_posts', self.dump, stdout=StringIO(), stderr=StringIO()
+        )
+        self.assertFalse(Post.objects.exists())
+        self.assertFalse(os.path.exists(f'{self.dump}.progress'))
@@ -0,0 +1,85 @@
+import threading
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import Client, TransactionTestCase
+from django.urls import reverse
+
+from ..models import Comment, Follow, Post, User, UserStats
+
+CREATE_POST = reverse('posts:post_create')
+
+
+class ConcurrentWritesTest(TransactionTestCase):
+    THREADS = 4
+    ROUNDS = 5
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.post = Post.objects.create(author=self.author, text='Текст')
+        self.writers = [
+            User.objects.create_user(username=f'writer_{i}')
+            for i in range(self.THREADS)
+        ]
+
+    def write(self, user, errors):
+        client = Client()
+        client.force_login(user)
+        follow = reverse('posts:profile_follow', args=[self.author])
+        unfollow = reverse('posts:profile_unfollow', args=[self.author])
+        comment = reverse('posts:add_comment', args=[self.post.pk])
+        try:
+            for i in range(self.ROUNDS):
+                responses = [
+                    client.post(CREATE_POST, {'text': f'Запись {i}'}),
+                    client.post(comment, {'text': f'Комментарий {i}'}),
+                    client.get(follow),
+                    client.get(unfollow),
+                    client.get(follow),
+                ]
+                for response in responses:
+                    self.assertEqual(response.status_code, 302)
+        except Exception as error:
+            errors.append(error)
+        finally:
+            connection.close()
+
+    def test_parallel_write_views(self):
+        """Параллельные записи не падают с database is locked."""
+        errors = []
+        threads = [
+            threading.Thread(target=self.write, args=(user, errors))
+            for user in self.writers
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        total = self.THREADS * self.ROUNDS
+        self.assertEqual(Post.objects.exclude(pk=self.post.pk).count(), total)
+        self.assertEqual(Comment.objects.filter(post=self.post).count(), total)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, total)
+        self.assertEqual(
+            Follow.objects.filter(author=self.author).count(), self.THREADS
+        )
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).followers_count,
+            self.THREADS,
+        )
+
+    def test_only_saves_take_write_lock(self):
+        """Показ и проверка формы идут без транзакции с BEGIN IMMEDIATE."""
+        client = Client()
+        client.force_login(self.author)
+        with mock.patch(
+            'core.decorators.transaction', wraps=transaction
+        ) as patched:
+            client.get(CREATE_POST)
+            client.post(CREATE_POST, {'text': ''})
+            patched.atomic.assert_not_called()
+            client.post(CREATE_POST, {'text': 'Текст'})
+            patched.atomic.assert_called_once_with()
@@ -1,18 +1,24 @@
+import hashlib
+import os
 import tempfile
 import shutil
+from io import BytesIO
+from unittest import mock
+
+from PIL import Image
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
-from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 
-from ..forms import forms
+from .. import uploads
+from ..forms import PostForm, forms
 from ..models import Comment, Group, Post, User
 
 CREATE_POST = reverse('posts:post_create')
 USERNAME = 'tester'
 PROFILE = reverse('posts:profile',
                   kwargs={'username': USERNAME})
-TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
 SMALL_GIF = (
     b'\x47\x49\x46\x38\x39\x61\x02\x00'
     b'\x01\x00\x80\x00\x00\x00\x00\x00'
@@ -71,7 +77,11 @@ class PostCreateFormTests(TestCase):
         form_data = {
             'text': 'text',
             'group': self.group.pk,
-            'image': UPLOADED,
+            'image': SimpleUploadedFile(
+                name='small.gif',
+                content=SMALL_GIF,
+                content_type='image/gif'
+            ),
         }
         """Тестирование создания поста"""
         posts_count = Post.objects.count()
@@ -87,11 +97,11 @@ class PostCreateFormTests(TestCase):
         self.assertEqual(post.text, form_data['text'])
         self.assertEqual(post.group.id, form_data['group'])
         self.assertEqual(post.author, self.user)
+        self.assertTrue(post.image)
         self.assertRedirects(response, PROFILE)
+        digest = hashlib.sha256(SMALL_GIF).hexdigest()
         self.assertTrue(
-            Post.objects.filter(
-                image='posts/small.gif'
-            ).first()
+            post.image.name.startswith(f'posts/{digest[:2]}/{digest}.')
         )
 
     def test_editing_post(self):
@@ -156,3 +166,63 @@ class PostCreateFormTests(TestCase):
             follow=True
         )
         self.assertEqual(Comment.objects.count(), comments_count + 1)
+
+
+def image_upload(size, format='JPEG', **options):
+    output = BytesIO()
+    Image.new('RGB', size, (200, 30, 30)).save(output, format, **options)
+    return SimpleUploadedFile(
+        f'photo.{format.lower()}', output.getvalue(), f'image/{format}'
+    )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageUploadTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user(username=USERNAME))
+
+    def create_post(self, image):
+        self.client.post(CREATE_POST, {'text': 'Фото', 'image': image})
+        return Post.objects.latest('pk')
+
+    def test_photo_is_downscaled_without_exif(self):
+        exif = Image.Exif()
+        # Камеру держали боком: картинку нужно повернуть.
+        exif[0x0112] = 6
+        exif[0x010F] = 'Камера'
+        post = self.create_post(
+            image_upload((3000, 1000), exif=exif.tobytes())
+        )
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(max(stored.size), uploads.IMAGE_MAX_SIDE)
+            self.assertGreater(stored.height, stored.width)
+            self.assertFalse(stored.getexif())
+            if stored.format == 'JPEG':
+                self.assertTrue(stored.info.get('progressive'))
+
+    def test_duplicate_uploads_are_stored_once(self):
+        first = self.create_post(image_upload((40, 30)))
+        second = self.create_post(image_upload((40, 30)))
+        self.assertEqual(first.image.name, second.image.name)
+        folder = os.path.dirname(first.image.path)
+        self.assertEqual(len(os.listdir(folder)), 1)
+
+    def test_bad_images_are_rejected(self):
+        upload = SimpleUploadedFile('photo.jpg', b'not an image')
+        form = PostForm({'text': 'Фото'}, {'image': upload})
+        self.assertIn('image', form.errors)
+        with mock.patch.object(uploads, 'IMAGE_MAX_PIXELS', 100):
+            form = PostForm(
+                {'text': 'Фото'}, {'image': image_upload((20, 20))}
+            )
+            self.assertIn('image', form.errors)
+        with mock.patch.object(uploads, 'IMAGE_MAX_UPLOAD', 10):
+            form = PostForm(
+                {'text': 'Фото'}, {'image': image_upload((20, 20))}
+            )
+            self.assertIn('image', form.errors)
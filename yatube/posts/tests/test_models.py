@@ -1,6 +1,15 @@
-from django.test import TestCase
+from io import StringIO
+from unittest import mock
 
-from ..models import Group, Post, User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..admin import PostAdmin
+from ..counts import ALL_POSTS, get_count, group_scope
+from ..forms import PostForm
+from ..models import Comment, Follow, Group, Post, User, UserStats
 
 
 class PostModelTest(TestCase):
@@ -22,3 +31,142 @@ class PostModelTest(TestCase):
     def test_models_have_correct_object_names(self):
         self.assertEqual(str(self.group), self.group.title)
         self.assertEqual(str(self.post), self.post.text[:15])
+
+
+class PostCountTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='tester')
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_counts_follow_post_writes(self):
+        '''Счётчики меняются при записи постов без повторного COUNT(*)'''
+        group_posts = self.group.posts.all()
+        self.assertEqual(get_count(ALL_POSTS, Post.objects.all()), 0)
+        self.assertEqual(get_count(group_scope(self.group.pk), group_posts), 0)
+        post = Post.objects.create(author=self.user, text='Текст')
+        with self.assertNumQueries(0):
+            self.assertEqual(get_count(ALL_POSTS, Post.objects.all()), 1)
+        post.group = self.group
+        post.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                get_count(group_scope(self.group.pk), group_posts), 1
+            )
+        post.delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_count(ALL_POSTS, Post.objects.all()), 0)
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='tester')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+
+    def assertCounters(self, posts, comments, followers):
+        self.group.refresh_from_db()
+        stats = UserStats.objects.get(user=self.user)
+        self.assertEqual(self.group.posts_count, posts)
+        self.assertEqual(stats.posts_count, posts)
+        self.assertEqual(stats.followers_count, followers)
+        self.assertEqual(
+            UserStats.objects.get(user=self.reader).following_count,
+            followers
+        )
+        self.assertEqual(
+            sum(Post.objects.values_list('comments_count', flat=True)),
+            comments
+        )
+
+    def test_counters_follow_writes(self):
+        '''Счётчики меняются при создании и удалении записей'''
+        post = Post.objects.create(
+            author=self.user, text='Текст', group=self.group
+        )
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Текст'
+        )
+        follow = Follow.objects.create(user=self.reader, author=self.user)
+        self.assertCounters(posts=1, comments=1, followers=1)
+        comment.delete()
+        follow.delete()
+        post.delete()
+        self.assertCounters(posts=0, comments=0, followers=0)
+
+    def test_recount_fixes_drift(self):
+        post = Post.objects.create(
+            author=self.user, text='Текст', group=self.group
+        )
+        Comment.objects.create(post=post, author=self.reader, text='Текст')
+        Follow.objects.create(user=self.reader, author=self.user)
+        Post.objects.update(comments_count=10)
+        Group.objects.update(posts_count=10)
+        UserStats.objects.update(
+            posts_count=10, followers_count=10, following_count=10
+        )
+        call_command('recount_counters', stdout=StringIO())
+        self.assertCounters(posts=1, comments=1, followers=1)
+
+    def test_edits_keep_concurrent_counts(self):
+        '''Правка поста не затирает счётчик, изменённый после загрузки
+        формы'''
+        post = Post.objects.create(author=self.user, text='Текст')
+        admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        is_valid = PostForm.is_valid
+        save_form = PostAdmin.save_form
+
+        def comment():
+            Comment.objects.create(post=post, author=self.reader, text='К')
+
+        def racing_is_valid(form):
+            comment()
+            return is_valid(form)
+
+        def racing_save_form(*args, **kwargs):
+            comment()
+            return save_form(*args, **kwargs)
+
+        client = Client()
+        client.force_login(self.user)
+        with mock.patch.object(PostForm, 'is_valid', racing_is_valid):
+            client.post(
+                reverse('posts:post_edit', args=[post.pk]),
+                {'text': 'Правка'},
+            )
+        client.force_login(admin)
+        with mock.patch.object(PostAdmin, 'save_form', racing_save_form):
+            client.post(
+                reverse('admin:posts_post_change', args=[post.pk]),
+                {'text': 'Правка админа', 'author': self.user.pk},
+            )
+        post.refresh_from_db()
+        self.assertEqual(post.text, 'Правка админа')
+        self.assertEqual(post.comments_count, 2)
+
+    def test_counters_are_not_editable_in_admin(self):
+        admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        client = Client()
+        client.force_login(admin)
+        for url, counter in (
+            (reverse('admin:posts_group_add'), 'posts_count'),
+            (reverse('admin:posts_post_add'), 'comments_count'),
+            (reverse('admin:posts_userstats_add'), 'followers_count'),
+        ):
+            with self.subTest(url=url):
+                form = client.get(url).context['adminform'].form
+                self.assertNotIn(counter, form.fields)
@@ -1,13 +1,36 @@
+import json
 import shutil
 import tempfile
-from django.test import TestCase, Client, override_settings
+from datetime import timedelta
+from unittest import mock, skipUnless
+
+from django.contrib.auth.models import AnonymousUser
+from django.db.models.query import QuerySet
+from django.template import Context, Template
+from django.test import TestCase, Client, RequestFactory, override_settings
 from django.urls import reverse
 from django.conf import settings
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.models.signals import post_save
+from django.test.utils import CaptureQueriesContext
+
+from core import instrumentation
 
-from ..models import User, Post, Group, Follow
-from ..settings import NUMBER_POSTS_ON_PAGE
+from .. import api, benchmark, follows, thumbnails
+from ..models import (
+    User, Post, Group, Comment, Follow, TimelineEntry, UserStats
+)
+from ..settings import (
+    NUMBER_COMMENTS_ON_PAGE, NUMBER_POSTS_ON_PAGE, THUMBNAIL_DEFAULT_WIDTH,
+    THUMBNAIL_SIZES, THUMBNAIL_SIZES_ATTR, THUMBNAIL_WIDTHS,
+    TIMELINE_FANOUT_LIMIT,
+)
+from ..management.commands.benchmark import private_caches
+from ..search import TermIndex, search_ids, tokenize
+from ..templatetags import responsive_images
+from ..thumbnails import generate
 
 USERNAME = 'tester'
 SLUG = 'test-slug'
@@ -20,7 +43,12 @@ GROUP_1 = reverse('posts:group',
 PROFILE = reverse('posts:profile',
                   kwargs={'username': USERNAME})
 TOTAL_POSTS = NUMBER_POSTS_ON_PAGE + 1
-TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+FOLLOW_INDEX = reverse('posts:follow_index')
+SEARCH = reverse('posts:search')
+# Сессия, пользователь, группа или автор, COUNT(*), посты и на профиле
+# ещё проверка подписки
+FEED_QUERY_BUDGET = 6
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
 SMALL_GIF = (
     b'\x47\x49\x46\x38\x39\x61\x02\x00'
     b'\x01\x00\x80\x00\x00\x00\x00\x00'
@@ -67,6 +95,8 @@ class PostUrlTests(TestCase):
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
     def setUp(self):
+        # Записи о миниатюрах лежат в кеше и переживают откат транзакции.
+        cache.clear()
         self.guest_client = Client()  # Гость
         self.authorized_client = Client()  # Авторизованный
         self.authorized_client.force_login(self.user)
@@ -119,6 +149,64 @@ class PostUrlTests(TestCase):
                          self.group.description
                          )
 
+    def test_index_shows_original_until_thumbnail_ready(self):
+        '''Пока миниатюры нет, лента показывает оригинал картинки'''
+        response = self.guest_client.get(INDEX)
+        self.assertContains(response, self.post.image.url)
+        for geometry_string, options in THUMBNAIL_SIZES:
+            generate(self.post.image.name, geometry_string, dict(options))
+        response = self.guest_client.get(INDEX)
+        self.assertNotContains(response, self.post.image.url)
+        self.assertContains(response, settings.MEDIA_URL + 'cache/')
+
+    def test_post_image_has_srcset(self):
+        '''Картинка поста выводится во всех ширинах одним чтением кеша'''
+        for geometry_string, options in THUMBNAIL_SIZES:
+            generate(self.post.image.name, geometry_string, dict(options))
+        kvstore_cache = thumbnails.default.kvstore.cache
+        with mock.patch.object(
+            kvstore_cache, 'get_many', wraps=kvstore_cache.get_many
+        ) as get_many:
+            html = Template(
+                '{% load responsive_images %}'
+                '{% responsive_image post.image "card-img" %}'
+            ).render(Context({'post': self.post}))
+        get_many.assert_called_once()
+        for width in THUMBNAIL_WIDTHS:
+            self.assertIn(f' {width}w', html)
+        self.assertIn(f'sizes="{THUMBNAIL_SIZES_ATTR}"', html)
+        self.assertIn(f'width="{THUMBNAIL_DEFAULT_WIDTH}"', html)
+
+    def test_missing_variants_scheduled(self):
+        '''Недостающие варианты ставятся в очередь, а не режутся в запросе'''
+        with mock.patch.object(thumbnails, 'schedule') as schedule:
+            found = thumbnails.lookup([self.post.image.name])
+        self.assertEqual(found, {self.post.image.name: []})
+        self.assertEqual(schedule.call_count, len(thumbnails.VARIANTS))
+
+    def test_feed_prefetches_images_once(self):
+        '''Миниатюры всей страницы ленты ищутся одним чтением'''
+        posts = [self.post] + [
+            Post.objects.create(
+                author=self.user, text='Ещё картинка', image=UPLOADED
+            )
+            for _ in range(2)
+        ]
+        for geometry_string, options in THUMBNAIL_SIZES:
+            generate(posts[0].image.name, geometry_string, dict(options))
+        with mock.patch.object(
+            responsive_images, 'lookup', wraps=responsive_images.lookup
+        ) as lookup, mock.patch.object(thumbnails, 'schedule') as schedule:
+            response = self.guest_client.get(INDEX)
+        lookup.assert_called_once()
+        self.assertEqual(
+            set(lookup.call_args[0][0]), {post.image.name for post in posts}
+        )
+        self.assertEqual(schedule.call_count, 2 * len(thumbnails.VARIANTS))
+        self.assertContains(response, 'srcset=', count=1)
+        for post in posts[1:]:
+            self.assertContains(response, post.image.url)
+
     def test_cache_index(self):
         """Проверка cache index.html"""
         response = self.authorized_client.get(INDEX)
@@ -146,6 +234,10 @@ class PaginatorViewsTest(TestCase):
             ) for i in range(TOTAL_POSTS)
         ])
 
+    def setUp(self):
+        # bulk_create не обновляет кэшированные счётчики постов.
+        cache.clear()
+
     def test_first_page_contains_records(self):
         response = self.client.get(INDEX)
         self.assertEqual(len(response.context['page_obj']),
@@ -157,6 +249,404 @@ class PaginatorViewsTest(TestCase):
         calculation_obj = TOTAL_POSTS % NUMBER_POSTS_ON_PAGE
         self.assertEqual(calculation_len_obj, calculation_obj)
 
+    def test_page_links_drop_foreign_params(self):
+        '''Ссылки ленты не переносят чужие параметры в общий кеш'''
+        self.client.get(INDEX, {'page': 1, 'utm': 'first'})
+        response = self.client.get(INDEX, {'page': 1})
+        self.assertContains(response, '?page=2')
+        self.assertNotContains(response, 'utm')
+
+    def test_search_links_keep_query(self):
+        ids = list(Post.objects.values_list('pk', flat=True))
+        with mock.patch('posts.search.search_ids', return_value=ids):
+            response = self.client.get(SEARCH, {'q': 'текст', 'utm': 'x'})
+        self.assertContains(response, 'q=%D1%82%D0%B5%D0%BA%D1%81%D1%82')
+        self.assertNotContains(response, 'utm')
+
+
+class CursorPaginatorViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='tester')
+        Post.objects.bulk_create([
+            Post(
+                text='Тестовый текст',
+                author=cls.user,
+            ) for i in range(TOTAL_POSTS)
+        ])
+
+    def setUp(self):
+        # bulk_create не обновляет кэшированные счётчики постов.
+        cache.clear()
+
+    def test_pages_follow_cursor(self):
+        '''Курсоры ведут на следующую и обратно на предыдущую страницу'''
+        first = self.client.get(f'{INDEX}?cursor=').context['page_obj']
+        self.assertEqual(len(first), NUMBER_POSTS_ON_PAGE)
+        self.assertFalse(first.has_previous())
+        second = self.client.get(
+            f'{INDEX}?cursor={first.next_cursor}'
+        ).context['page_obj']
+        self.assertEqual(len(second), TOTAL_POSTS % NUMBER_POSTS_ON_PAGE)
+        self.assertFalse(second.has_next())
+        back = self.client.get(
+            f'{INDEX}?cursor={second.previous_cursor}'
+        ).context['page_obj']
+        self.assertEqual(list(back), list(first))
+
+    def test_invalid_cursor_shows_first_page(self):
+        response = self.client.get(f'{INDEX}?cursor=broken')
+        self.assertEqual(len(response.context['page_obj']),
+                         NUMBER_POSTS_ON_PAGE)
+
+    @override_settings(POSTS_CURSOR_PAGINATION=True)
+    def test_old_page_links_still_work(self):
+        response = self.client.get(INDEX)
+        self.assertTrue(response.context['page_obj'].paginator.is_cursor)
+        response = self.client.get(f'{INDEX}?page=2')
+        self.assertEqual(response.context['page_obj'].number, 2)
+
+    def test_cached_cursor_page_skips_database(self):
+        '''Закэшированная курсорная страница не обращается к базе'''
+        for url in [f'{INDEX}?page=1', f'{INDEX}?cursor=']:
+            with self.subTest(url=url):
+                self.client.get(url)
+                with CaptureQueriesContext(connection) as queries:
+                    self.client.get(url)
+                self.assertEqual(len(queries), 0)
+
+
+class FeedQueriesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            slug=SLUG,
+            description='Тестовое описание',
+        )
+        authors = [
+            User.objects.create_user(username=f'author_{i}')
+            for i in range(NUMBER_POSTS_ON_PAGE)
+        ]
+        for author in authors:
+            Follow.objects.create(user=cls.user, author=author)
+            Post.objects.create(
+                text='Тестовый текст', author=author, group=cls.group
+            )
+            Post.objects.create(
+                text='Тестовый текст', author=cls.user, group=cls.group
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_feeds_fit_query_budget(self):
+        '''Число запросов ленты не зависит от числа постов на странице'''
+        for url in [INDEX, GROUP, PROFILE, FOLLOW_INDEX]:
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.authorized_client.get(url)
+                self.assertEqual(len(response.context['page_obj']),
+                                 NUMBER_POSTS_ON_PAGE)
+                self.assertLessEqual(len(queries), FEED_QUERY_BUDGET)
+
+    def explain(self, sql, params=()):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return ' '.join(str(row[-1]) for row in cursor.fetchall())
+
+    @skipUnless(connection.vendor == 'sqlite', 'План в формате SQLite')
+    def test_feeds_are_sorted_by_index(self):
+        '''Порядок лент берётся из индекса, без временного дерева'''
+        feeds = [
+            (INDEX, 'posts_post_pub_date'),
+            (GROUP, 'post_group_date_idx'),
+            (PROFILE, 'post_author_date_idx'),
+            (FOLLOW_INDEX, 'timeline_user_date_idx'),
+        ]
+        for url, index in feeds:
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    self.authorized_client.get(url)
+                plans = [
+                    self.explain(query['sql']) for query in queries
+                    if query['sql'].startswith('SELECT')
+                    and 'ORDER BY' in query['sql']
+                ]
+                self.assertTrue(any(index in plan for plan in plans), plans)
+                for plan in plans:
+                    self.assertNotIn('TEMP B-TREE', plan)
+
+    @skipUnless(connection.vendor == 'sqlite', 'План в формате SQLite')
+    def test_comments_and_followers_use_composite_indexes(self):
+        post = Post.objects.first()
+        lookups = [
+            (Comment.objects.filter(post=post).order_by('created'),
+             'comment_post_created_idx'),
+            (Follow.objects.filter(author=post.author).values('user_id'),
+             'follow_author_user_idx'),
+        ]
+        for queryset, index in lookups:
+            with self.subTest(index=index):
+                plan = self.explain(*queryset.query.sql_with_params())
+                self.assertIn(index, plan)
+                self.assertNotIn('TEMP B-TREE', plan)
+
+
+class FeedCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            slug=SLUG,
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Тестовый текст',
+            group=cls.group,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_feed_served_from_cache_until_post_changes(self):
+        '''Лента берётся из кэша, пока не изменится пост в её области'''
+        for url in [INDEX, GROUP, PROFILE]:
+            with self.subTest(url=url):
+                self.client.get(url)
+                Post.objects.filter(pk=self.post.pk).update(text='Скрыто')
+                self.assertNotContains(self.client.get(url), 'Скрыто')
+                self.post.text = 'Новый текст'
+                self.post.save()
+                self.assertContains(self.client.get(url), 'Новый текст')
+
+    def test_feed_cache_depends_on_page_and_login(self):
+        '''Гость и пользователь, разные страницы не делят одну запись'''
+        guest = self.client.get(INDEX).context['feed_cache_key']
+        user = self.authorized_client.get(INDEX).context['feed_cache_key']
+        page = self.client.get(f'{INDEX}?page=2').context['feed_cache_key']
+        self.assertEqual(len({guest, user, page}), 3)
+
+    def test_feed_version_bumped_again_on_commit(self):
+        '''После фиксации версия меняется ещё раз: кеш до неё устарел'''
+        callbacks = []
+        with mock.patch(
+            'posts.feeds.transaction.on_commit', callbacks.append
+        ):
+            self.post.text = 'Новый текст'
+            self.post.save()
+        key = self.client.get(INDEX).context['feed_cache_key']
+        self.assertTrue(callbacks)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(
+            self.client.get(INDEX).context['feed_cache_key'], key
+        )
+
+
+class CommentPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый текст')
+        for i in range(NUMBER_COMMENTS_ON_PAGE + 5):
+            Comment.objects.create(
+                post=cls.post,
+                author=User.objects.create_user(username=f'reader_{i}'),
+                text=f'Комментарий {i}',
+            )
+        cls.post_detail = reverse(
+            'posts:post_detail', kwargs={'post_id': cls.post.pk}
+        )
+        cls.comments = reverse(
+            'posts:comments', kwargs={'post_id': cls.post.pk}
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_first_page_in_order_of_writing(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.post_detail)
+        comments = response.context['comments']
+        self.assertEqual(
+            [comment.text for comment in comments],
+            [f'Комментарий {i}' for i in range(NUMBER_COMMENTS_ON_PAGE)],
+        )
+        self.assertContains(response, 'reader_0')
+        self.assertContains(response, self.comments + '?cursor=')
+        # Пост с автором и группой и одна страница комментариев с авторами
+        self.assertLessEqual(len(queries), 2)
+
+    def test_load_more_by_cursor(self):
+        cursor = self.client.get(
+            self.post_detail
+        ).context['comments'].next_cursor
+        response = self.client.get(self.comments, {'cursor': cursor})
+        self.assertContains(response, f'Комментарий {NUMBER_COMMENTS_ON_PAGE}')
+        self.assertNotContains(response, 'Комментарий 0<')
+        self.assertNotContains(response, 'comments-more')
+        data = self.client.get(
+            self.comments, {'cursor': cursor, 'format': 'json'}
+        ).json()
+        self.assertEqual(len(data['comments']), 5)
+        self.assertEqual(data['comments'][0]['author'], 'reader_20')
+        self.assertIsNone(data['next_cursor'])
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            slug=SLUG,
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Тестовый текст',
+            group=cls.group,
+        )
+        cls.post_detail = reverse(
+            'posts:post_detail', kwargs={'post_id': cls.post.pk}
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def test_unchanged_pages_are_not_modified(self):
+        for url in [INDEX, GROUP, PROFILE, self.post_detail]:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertIn('public', response['Cache-Control'])
+                self.assertIn('s-maxage', response['Cache-Control'])
+                etag = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=response['ETag']
+                )
+                self.assertEqual(etag.status_code, 304)
+                since = self.client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+                )
+                self.assertEqual(since.status_code, 304)
+
+    def test_changes_in_scope_change_etag(self):
+        changes = [
+            (INDEX, lambda: Post.objects.create(
+                author=self.reader, text='Новый пост'
+            )),
+            (GROUP, lambda: self.group.save()),
+            (PROFILE, lambda: Follow.objects.create(
+                user=self.reader, author=self.user
+            )),
+            (self.post_detail, lambda: Comment.objects.create(
+                post=self.post, author=self.reader, text='Комментарий'
+            )),
+        ]
+        for url, change in changes:
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                change()
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_user_pages_are_private(self):
+        response = self.authorized_client.get(INDEX)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertNotIn('Last-Modified', response)
+        self.assertNotEqual(response['ETag'], self.client.get(INDEX)['ETag'])
+        response = self.authorized_client.get(
+            INDEX, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, 304)
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.cats = Post.objects.create(
+            text='Кошки любят молоко', author=cls.user
+        )
+        cls.dogs = Post.objects.create(
+            text='Собака ЛЮБИТ кости', author=cls.user
+        )
+
+    def test_tokenize_stems_russian_words(self):
+        self.assertEqual(tokenize('Кошки'), tokenize('кошка'))
+        self.assertEqual(tokenize('Ёлки'), tokenize('елка'))
+
+    def test_search_finds_word_forms(self):
+        '''Поиск находит другие формы слова и не зависит от регистра'''
+        response = self.client.get(SEARCH, {'q': 'кошка'})
+        self.assertEqual(list(response.context['page_obj']), [self.cats])
+        response = self.client.get(SEARCH, {'q': 'любить'})
+        self.assertEqual(len(response.context['page_obj']), 2)
+        self.dogs.delete()
+        self.assertEqual(search_ids('собака'), [])
+
+    def test_fresh_posts_rank_higher(self):
+        '''При равной релевантности свежий пост выше старого'''
+        Post.objects.filter(pk=self.cats.pk).update(
+            pub_date=self.cats.pub_date - timedelta(days=365)
+        )
+        new = Post.objects.create(text='Кошки любят молоко', author=self.user)
+        self.assertEqual(search_ids('кошка'), [new.pk, self.cats.pk])
+
+    def test_results_keep_rank_order(self):
+        '''Выдача идёт по рангу, даже если в адресе есть ?cursor='''
+        ranked = [self.cats.pk, self.dogs.pk]
+        with mock.patch('posts.search.search_ids', return_value=ranked):
+            for params in [{}, {'cursor': ''}]:
+                with self.subTest(params=params):
+                    response = self.client.get(
+                        SEARCH, {'q': 'любить', **params}
+                    )
+                    self.assertEqual(
+                        list(response.context['page_obj']),
+                        [self.cats, self.dogs],
+                    )
+
+    @mock.patch('posts.search.SEARCH_MAX_RESULTS', 1)
+    def test_admin_search_is_not_capped(self):
+        '''Админка находит все подходящие посты, а не только лучшие'''
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'любить'}
+        )
+        self.assertEqual(
+            set(response.context['cl'].result_list), {self.cats, self.dogs}
+        )
+        self.assertEqual(len(search_ids('любить')), 1)
+
+    def test_term_index_fallback(self):
+        index = TermIndex()
+        for post in Post.objects.all():
+            index.update(post)
+        self.assertEqual(
+            [pk for pk, _ in index.search(tokenize('кошкам'), 10)],
+            [self.cats.pk]
+        )
+
 
 class FollowUnfollowTest(TestCase):
     @classmethod
@@ -167,6 +657,7 @@ class FollowUnfollowTest(TestCase):
         cls.not_follower = User.objects.create_user(username='not_follower')
 
     def setUp(self):
+        cache.clear()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.following)
         self.authorized_client_1 = Client()
@@ -219,5 +710,262 @@ class FollowUnfollowTest(TestCase):
         response = self.authorized_client_1.get(reverse('posts:follow_index'))
         self.assertEqual(len(response.context['page_obj']), count_posts)
 
+    def test_profile_shows_own_subscription(self):
+        profile = reverse('posts:profile', kwargs={'username': self.follower})
+        Follow.objects.create(user=self.not_follower, author=self.follower)
+        response = self.authorized_client.get(profile)
+        self.assertFalse(response.context['following'])
+        follows.follow(self.following, self.follower)
+        response = self.authorized_client.get(profile)
+        self.assertTrue(response.context['following'])
+
+    def test_repeated_follow_is_ignored(self):
+        self.assertTrue(follows.follow(self.following, self.follower))
+        self.assertFalse(follows.follow(self.following, self.follower))
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(self.follower.stats.followers_count, 1)
+
+    def test_follow_signal_gets_new_row(self):
+        Follow.objects.create(user=self.follower, author=self.following)
+        saved = []
+
+        def receiver(instance, **kwargs):
+            saved.append(instance.pk)
+
+        post_save.connect(receiver, sender=Follow)
+        self.addCleanup(post_save.disconnect, receiver, sender=Follow)
+        follows.follow(self.following, self.follower)
+        self.assertEqual(
+            saved,
+            [Follow.objects.get(user=self.following, author=self.follower).pk],
+        )
+
+    def test_follow_graph_is_cached_until_follow_changes(self):
+        Follow.objects.create(user=self.following, author=self.follower)
+        self.assertEqual(
+            follows.following_ids(self.following.pk), {self.follower.pk}
+        )
+        with self.assertNumQueries(0):
+            self.assertTrue(
+                follows.is_following(self.following, self.follower)
+            )
+            self.assertFalse(
+                follows.is_following(self.following, self.not_follower)
+            )
+        self.assertEqual(
+            follows.follower_ids(self.follower.pk), {self.following.pk}
+        )
+        follows.unfollow(self.following, self.follower)
+        self.assertFalse(follows.is_following(self.following, self.follower))
+        self.assertEqual(follows.follower_ids(self.follower.pk), set())
+
 
 cache.clear()
+
+
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def get_feed(self):
+        response = self.authorized_client.get(FOLLOW_INDEX)
+        return list(response.context['page_obj'])
+
+    def test_timeline_follows_subscriptions(self):
+        '''Лента наполняется при подписке и публикации, чистится при
+        отписке'''
+        old = Post.objects.create(text='Старый пост', author=self.author)
+        Follow.objects.create(user=self.reader, author=self.author)
+        new = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 2
+        )
+        self.assertEqual(self.get_feed(), [new, old])
+        Follow.objects.filter(user=self.reader, author=self.author).delete()
+        self.assertFalse(TimelineEntry.objects.filter(user=self.reader))
+        self.assertEqual(self.get_feed(), [])
+
+    def test_popular_author_is_pulled(self):
+        '''Посты популярных авторов подмешиваются при чтении'''
+        Follow.objects.create(user=self.reader, author=self.author)
+        UserStats.objects.filter(user=self.author).update(
+            followers_count=TIMELINE_FANOUT_LIMIT
+        )
+        post = Post.objects.create(text='Пост', author=self.author)
+        self.assertFalse(TimelineEntry.objects.filter(user=self.reader))
+        self.assertEqual(self.get_feed(), [post])
+
+    def test_author_below_limit_is_fanned_out(self):
+        '''Посты, написанные выше порога, остаются в ленте, когда автор
+        опускается ниже него'''
+        other = User.objects.create_user(username='other')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=other, author=self.author)
+        UserStats.objects.filter(user=self.author).update(
+            followers_count=TIMELINE_FANOUT_LIMIT
+        )
+        post = Post.objects.create(text='Пост', author=self.author)
+        self.assertFalse(TimelineEntry.objects.filter(post=post))
+        Follow.objects.filter(user=other).delete()
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.reader, post=post)
+        )
+        self.assertEqual(self.get_feed(), [post])
+
+
+class BenchmarkTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_every_route_is_measured(self):
+        """Прогон на маленьких данных проходит все маршруты без ошибок."""
+        data = benchmark.seed(
+            users=3, groups=1, posts=3, comments=2, follows=2, random_seed=1
+        )
+        transport = benchmark.ClientTransport()
+        for scenario in benchmark.scenarios(data):
+            with self.subTest(route=scenario.name):
+                result = benchmark.measure(transport, scenario, 3)
+                self.assertLessEqual(
+                    result['p50_ms'], result['p95_ms']
+                )
+                statuses = {int(status) for status in result['status']}
+                self.assertTrue(statuses <= {200, 302}, statuses)
+
+    def test_compare_reports_regressions(self):
+        baseline = {'routes': {'index': {'p95_ms': 10, 'queries': 3}}}
+        results = {'routes': {'index': {'p95_ms': 13, 'queries': 4}}}
+        self.assertEqual(len(benchmark.compare(results, baseline, 0.2)), 2)
+        self.assertEqual(len(benchmark.compare(results, baseline, 0.5)), 1)
+
+    @override_settings(CACHES={
+        'default': {
+            'BACKEND': 'core.cache.TwoLevelCache',
+            'OPTIONS': {'SHARED': 'shared'},
+        },
+        'shared': {
+            'BACKEND': 'core.cache.SQLiteCache',
+            'LOCATION': 'cache.sqlite3',
+        },
+    })
+    def test_command_uses_private_caches(self):
+        """Замер не пишет в общий кеш сайта."""
+        caches = private_caches()
+        self.assertEqual(caches['default'], settings.CACHES['default'])
+        self.assertEqual(caches['shared']['BACKEND'], 'core.cache.LocMemCache')
+
+
+class ApiTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USERNAME)
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            slug=SLUG,
+            description='Тестовое описание',
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.user, text=f'Пост {i}', group=cls.group
+            )
+            for i in range(3)
+        ]
+        Follow.objects.create(user=cls.reader, author=cls.user)
+        Comment.objects.create(
+            post=cls.posts[0], author=cls.reader, text='Комментарий'
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_sparse_fields_and_cursor(self):
+        url = reverse('api:posts')
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get(
+                url, {'fields': 'id,text,author', 'limit': 2}
+            ).json()
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(data['results'][0], {
+            'id': self.posts[2].pk, 'text': 'Пост 2', 'author': USERNAME,
+        })
+        self.assertIsNone(data['previous'])
+        rest = self.client.get(data['next']).json()
+        self.assertEqual(
+            [row['text'] for row in rest['results']], ['Пост 0']
+        )
+        self.assertIsNone(rest['next'])
+        response = self.client.get(url, {'fields': 'id,password'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(url, {'cursor': 'мусор'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_stream_export(self):
+        response = self.client.get(
+            reverse('api:group_posts', args=[SLUG]),
+            {'stream': 1, 'fields': 'text'},
+        )
+        self.assertTrue(response.streaming)
+        rows = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(
+            rows, [{'text': f'Пост {i}'} for i in reversed(range(3))]
+        )
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_stream_reads_replica(self):
+        '''Тело потока читается с реплики, хотя view уже завершился'''
+        databases = []
+
+        def iterator(queryset, *args, **kwargs):
+            databases.append(queryset.db)
+            return iter([])
+
+        request = RequestFactory().get('/', {'stream': 1})
+        request.user = AnonymousUser()
+        with mock.patch.object(QuerySet, 'iterator', iterator):
+            response = api.posts(request)
+            b''.join(response.streaming_content)
+        self.assertEqual(databases, ['replica'])
+
+    def test_stream_is_instrumented(self):
+        instrumentation.reset()
+        response = self.client.get(reverse('api:posts'), {'stream': 1})
+        b''.join(response.streaming_content)
+        stats = instrumentation.snapshot()['api:posts']
+        self.assertGreater(stats['queries']['mean'], 0)
+
+    def test_resources(self):
+        profile = self.client.get(
+            reverse('api:profile', args=[USERNAME])
+        ).json()
+        self.assertEqual(profile['posts_count'], 3)
+        self.assertEqual(profile['followers_count'], 1)
+        group = self.client.get(reverse('api:group', args=[SLUG])).json()
+        self.assertEqual(group['posts_count'], 3)
+        comments = self.client.get(
+            reverse('api:comments', args=[self.posts[0].pk])
+        ).json()['results']
+        self.assertEqual(comments[0]['author'], 'reader')
+        response = self.client.get(reverse('api:profile', args=['nobody']))
+        self.assertEqual(response.status_code, 404)
+
+    def test_follow_feed_needs_login(self):
+        url = reverse('api:follow')
+        self.assertEqual(self.client.get(url).status_code, 401)
+        self.client.force_login(self.reader)
+        data = self.client.get(url, {'fields': 'id,following'}).json()
+        self.assertEqual(
+            data['results'],
+            [
+                {'id': post.pk, 'following': True}
+                for post in reversed(self.posts)
+            ],
+        )
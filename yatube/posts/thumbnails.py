@@ -0,0 +1,173 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections, transaction
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend as BaseThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings, settings
+from sorl.thumbnail.helpers import serialize
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore
+
+from .counts import post_scopes
+from .feeds import bump_feed_versions
+from .models import Post
+from .settings import THUMBNAIL_SIZES, THUMBNAIL_WORKERS
+from .uploads import WEBP
+
+logger = logging.getLogger(__name__)
+
+# Те же ширины ещё и в WebP, если Pillow умеет его сохранять
+VARIANTS = THUMBNAIL_SIZES + tuple(
+    (geometry_string, {**options, 'format': 'WEBP'})
+    for geometry_string, options in THUMBNAIL_SIZES
+    if WEBP
+)
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+class ThumbnailBackend(BaseThumbnailBackend):
+    """Не режет картинки во время запроса.
+
+    Пока миниатюры нет в хранилище ключей, отдаёт оригинал и ставит
+    нарезку в фоновую очередь.
+    """
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        if not file_:
+            raise ValueError('falsey file_ argument in get_thumbnail()')
+        source = ImageFile(file_)
+        name = self.thumbnail_name(source, geometry_string, dict(options))
+        cached = default.kvstore.get(ImageFile(name, default.storage))
+        if cached:
+            return cached
+        schedule(source.name, geometry_string, options)
+        return source
+
+    def thumbnail_name(self, source, geometry_string, options):
+        # Те же умолчания, что и в ThumbnailBackend.get_thumbnail.
+        if settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        return self._get_thumbnail_filename(source, geometry_string, options)
+
+    def generate(self, file_, geometry_string, **options):
+        """Создаёт миниатюру сразу, как это делает sorl."""
+        return super().get_thumbnail(file_, geometry_string, **options)
+
+
+def thumbnail_key(name, geometry_string, options):
+    """Ключ записи о миниатюре в хранилище ключей sorl."""
+    source = ImageFile(name, default.storage)
+    thumbnail = ImageFile(
+        default.backend.thumbnail_name(source, geometry_string, dict(options)),
+        default.storage,
+    )
+    return add_prefix(thumbnail.key)
+
+
+def lookup(names, sizes=VARIANTS):
+    """Готовые миниатюры картинок names одним чтением кеша.
+
+    Возвращает {имя: [(options, ImageFile), ...]} только с готовыми
+    вариантами. Чего нет в кеше, добирается из базы одним запросом, а
+    чего нет и там, ставится в очередь нарезки.
+    """
+    wanted = {
+        thumbnail_key(name, geometry_string, options):
+            (name, geometry_string, options)
+        for name in names
+        for geometry_string, options in sizes
+    }
+    kvstore_cache = default.kvstore.cache
+    values = kvstore_cache.get_many(list(wanted))
+    # Вместо отсутствующих записей sorl кладёт в кеш заглушку, не строку.
+    missing = [key for key in wanted if not isinstance(values.get(key), str)]
+    if missing:
+        stored = dict(
+            KVStore.objects.filter(key__in=missing).values_list(
+                'key', 'value'
+            )
+        )
+        kvstore_cache.set_many(stored, settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(stored)
+    found = {name: [] for name in names}
+    for key, (name, geometry_string, options) in wanted.items():
+        value = values.get(key)
+        if isinstance(value, str):
+            found[name].append((options, deserialize_image_file(value)))
+        else:
+            schedule(name, geometry_string, options)
+    return found
+
+
+def get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+    return _executor
+
+
+def generate(name, geometry_string, options):
+    """Создаёт миниатюру и сбрасывает ленты, где показывался оригинал."""
+    default.backend.generate(name, geometry_string, **options)
+    for post in Post.objects.filter(image=name).values(
+        'group_id', 'author_id'
+    ):
+        bump_feed_versions(post_scopes(post['group_id'], post['author_id']))
+
+
+def generate_logged(name, geometry_string, options):
+    try:
+        generate(name, geometry_string, options)
+    except Exception:
+        logger.exception('Не удалось создать миниатюру %s', name)
+
+
+def run(name, geometry_string, options):
+    try:
+        generate_logged(name, geometry_string, options)
+    finally:
+        with _lock:
+            _pending.discard((name, geometry_string, serialize(options)))
+        close_old_connections()
+
+
+def submit(name, geometry_string, options):
+    if not settings.THUMBNAIL_BACKGROUND:
+        generate_logged(name, geometry_string, options)
+        return
+    key = (name, geometry_string, serialize(options))
+    with _lock:
+        if key in _pending:
+            return
+        _pending.add(key)
+    get_executor().submit(run, name, geometry_string, options)
+
+
+def schedule(name, geometry_string, options):
+    """Ставит нарезку в очередь после фиксации текущей транзакции."""
+    transaction.on_commit(
+        lambda: submit(name, geometry_string, options)
+    )
+
+
+def schedule_image(image):
+    """Ставит в очередь все размеры, которые выводят шаблоны."""
+    if image:
+        for geometry_string, options in VARIANTS:
+            schedule(image.name, geometry_string, dict(options))
@@ -0,0 +1,124 @@
+import random
+
+from django.db.models import Q
+
+from .feeds import feed_queryset
+from .models import Follow, Post, TimelineEntry, UserStats
+from .settings import (
+    TIMELINE_FANOUT_LIMIT, TIMELINE_MAX_LENGTH, TIMELINE_TRIM_EVERY
+)
+
+
+def is_pulled(author_id):
+    """Посты автора с огромной аудиторией подмешиваются при чтении."""
+    return UserStats.objects.filter(
+        user_id=author_id, followers_count__gte=TIMELINE_FANOUT_LIMIT
+    ).exists()
+
+
+def add_entries(entries):
+    TimelineEntry.objects.bulk_create(
+        entries, batch_size=500, ignore_conflicts=True
+    )
+
+
+def trim(user_id):
+    """Оставляет в ленте только TIMELINE_MAX_LENGTH последних записей."""
+    entries = TimelineEntry.objects.filter(user_id=user_id)
+    cutoff = entries.order_by('-pub_date', '-id').values_list(
+        'pub_date', flat=True
+    )[TIMELINE_MAX_LENGTH:TIMELINE_MAX_LENGTH + 1]
+    if cutoff:
+        entries.filter(pub_date__lte=cutoff[0]).delete()
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if is_pulled(post.author_id):
+        return
+    followers = Follow.objects.filter(author_id=post.author_id).values_list(
+        'user_id', flat=True
+    )
+    add_entries(
+        TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+        for user_id in followers.iterator()
+    )
+    # Подрезаем ленты выборочно, чтобы раскладка оставалась дешёвой.
+    for user_id in followers.iterator():
+        if random.randrange(TIMELINE_TRIM_EVERY) == 0:
+            trim(user_id)
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту подписчика последние посты автора."""
+    if is_pulled(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).values_list(
+        'pk', 'pub_date'
+    )[:TIMELINE_MAX_LENGTH]
+    add_entries(
+        TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+        for pk, pub_date in posts
+    )
+    trim(user_id)
+
+
+def remove(user_id, author_id):
+    """Убирает из ленты посты автора, от которого отписались."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def unpull(author_id):
+    """Раскладывает последние посты автора, переставшего подмешиваться.
+
+    Пока подписчиков было не меньше TIMELINE_FANOUT_LIMIT, fan_out
+    пропускал его посты, и без этого они пропали бы из лент.
+    """
+    if not UserStats.objects.filter(
+        user_id=author_id, followers_count=TIMELINE_FANOUT_LIMIT - 1
+    ).exists():
+        return
+    posts = list(
+        Post.objects.filter(author_id=author_id).values_list(
+            'pk', 'pub_date'
+        )[:TIMELINE_MAX_LENGTH]
+    )
+    followers = Follow.objects.filter(author_id=author_id).values_list(
+        'user_id', flat=True
+    )
+    add_entries(
+        TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+        for user_id in followers.iterator()
+        for pk, pub_date in posts
+    )
+    for user_id in followers.iterator():
+        if random.randrange(TIMELINE_TRIM_EVERY) == 0:
+            trim(user_id)
+
+
+def timeline_queryset(user):
+    """Лента подписок: разложенные посты плюс посты подмешиваемых авторов."""
+    pulled = Follow.objects.filter(
+        user=user,
+        author__stats__followers_count__gte=TIMELINE_FANOUT_LIMIT,
+    ).values_list('author_id', flat=True)
+    if not pulled.exists():
+        # Дата копируется в запись ленты, поэтому сортировка идёт по
+        # индексу timeline_user_date_idx без сортировки во временном дереве.
+        return feed_queryset(timeline_entries__user=user).order_by(
+            '-timeline_entries__pub_date'
+        )
+    return feed_queryset().filter(
+        Q(pk__in=TimelineEntry.objects.filter(user=user).values('post_id'))
+        | Q(author_id__in=pulled)
+    )
+
+
+def rebuild():
+    """Собирает все ленты заново по текущим подпискам."""
+    TimelineEntry.objects.all().delete()
+    follows = Follow.objects.values_list('user_id', 'author_id')
+    for user_id, author_id in follows.iterator():
+        backfill(user_id, author_id)
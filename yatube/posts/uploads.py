@@ -0,0 +1,143 @@
+"""Обработка загруженных картинок постов.
+
+Загрузка пишется во временный файл по частям, хеш считается по ходу.
+Перед декодированием проверяются формат и размеры из заголовка, затем
+картинка поворачивается по EXIF, уменьшается, теряет метаданные и
+пересжимается. Имя файла — хеш загрузки, поэтому одинаковые картинки
+хранятся один раз и даже не декодируются повторно.
+"""
+import hashlib
+import shutil
+import tempfile
+
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from PIL import Image, ImageOps, features
+
+from .settings import (
+    IMAGE_FORMATS, IMAGE_MAX_PIXELS, IMAGE_MAX_SIDE, IMAGE_MAX_UPLOAD,
+    IMAGE_QUALITY,
+)
+
+WEBP = features.check('webp')
+EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif'}
+
+
+class ImageUploadHandler(TemporaryFileUploadHandler):
+    """Пишет загрузку во временный файл и считает её SHA-256.
+
+    Всё, что сверх IMAGE_MAX_UPLOAD байт, не записывается: форма всё
+    равно отклонит файл по размеру.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hash = hashlib.sha256()
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received <= IMAGE_MAX_UPLOAD:
+            self.hash.update(raw_data)
+            self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        file.sha256 = self.hash.hexdigest()
+        return file
+
+
+def upload_digest(upload):
+    digest = getattr(upload, 'sha256', None)
+    if digest is None:
+        digest = hashlib.sha256()
+        for chunk in upload.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        upload.seek(0)
+    return digest
+
+
+def has_alpha(image):
+    return image.mode in ('RGBA', 'LA', 'PA') or (
+        image.mode == 'P' and 'transparency' in image.info
+    )
+
+
+def output_format(image):
+    """WebP, если Pillow его умеет, иначе JPEG или PNG для прозрачных."""
+    if getattr(image, 'is_animated', False):
+        return 'GIF'
+    if WEBP:
+        return 'WEBP'
+    return 'PNG' if has_alpha(image) else 'JPEG'
+
+
+def open_checked(upload):
+    """Открывает картинку, прочитав только заголовок, и проверяет его."""
+    if upload.size > IMAGE_MAX_UPLOAD:
+        raise ValidationError(
+            f'Файл больше {IMAGE_MAX_UPLOAD // 2 ** 20} МБ',
+            code='file_too_large',
+        )
+    upload.seek(0)
+    try:
+        image = Image.open(upload)
+    except (OSError, SyntaxError):
+        raise ValidationError('Это не картинка', code='invalid_image')
+    if image.format not in IMAGE_FORMATS:
+        raise ValidationError(
+            f'Формат {image.format} не поддерживается',
+            code='invalid_image',
+        )
+    width, height = image.size
+    if width * height > IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Слишком большое разрешение картинки', code='invalid_image'
+        )
+    return image
+
+
+def encode(image, format):
+    """Уменьшенная копия без метаданных во временном файле."""
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((IMAGE_MAX_SIDE, IMAGE_MAX_SIDE), Image.LANCZOS)
+    if format == 'JPEG':
+        image = image.convert('RGB')
+    elif image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if has_alpha(image) else 'RGB')
+    # convert() переносит info, а из него PNG сохраняет EXIF.
+    image.info = {}
+    output = tempfile.TemporaryFile()
+    options = {
+        'JPEG': {'quality': IMAGE_QUALITY, 'optimize': True,
+                 'progressive': True},
+        'WEBP': {'quality': IMAGE_QUALITY, 'method': 6},
+        'PNG': {'optimize': True},
+    }[format]
+    image.save(output, format, **options)
+    output.seek(0)
+    return output
+
+
+def process_image(upload, storage, upload_to):
+    """Значение для ImageField: имя уже сохранённой копии или новый файл."""
+    image = open_checked(upload)
+    format = output_format(image)
+    digest = upload_digest(upload)
+    name = f'{digest[:2]}/{digest}.{EXTENSIONS[format]}'
+    if storage.exists(upload_to + name):
+        return upload_to + name
+    if format == 'GIF':
+        # Анимацию не пересжимаем: в GIF нет EXIF, а кадры потерялись бы.
+        output = tempfile.TemporaryFile()
+        upload.seek(0)
+        shutil.copyfileobj(upload, output)
+        output.seek(0)
+    else:
+        try:
+            output = encode(image, format)
+        except (OSError, SyntaxError, Image.DecompressionBombError):
+            raise ValidationError('Картинка повреждена', code='invalid_image')
+    return File(output, name=name)
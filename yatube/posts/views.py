@@ -1,72 +1,186 @@
-from django.core.paginator import Paginator
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.http import Http404, JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
 
-from .forms import PostForm, CommentForm
-from .models import Group, Post, User, Follow
-from .settings import NUMBER_POSTS_ON_PAGE
-
+from core.decorators import read_from_replica, retry_on_locked
+from core.http import render_conditional
 
-def pagination(request, objects):
-    paginator = Paginator(objects, NUMBER_POSTS_ON_PAGE)
+from .counts import ALL_POSTS, CountedPaginator, author_scope, group_scope
+from .feeds import (
+    ALL_GROUPS, feed_cache_context, feed_modified, feed_queryset,
+    feed_versions, follow_scope, replica_may_lag,
+)
+from .follows import follow, is_following, unfollow
+from .forms import PostForm, CommentForm
+from .models import Group, Post, User
+from .paginators import CursorPaginator
+from .search import search_posts
+from .settings import NUMBER_COMMENTS_ON_PAGE, NUMBER_POSTS_ON_PAGE
+from .thumbnails import schedule_image
+from .timeline import timeline_queryset
+
+
+def pagination(request, objects, scope=None):
+    # Курсорный режим включается параметром ?cursor= или настройкой
+    # POSTS_CURSOR_PAGINATION; старые ссылки ?page=N продолжают работать.
+    if 'cursor' in request.GET or (
+        settings.POSTS_CURSOR_PAGINATION and 'page' not in request.GET
+    ):
+        paginator = CursorPaginator(objects, NUMBER_POSTS_ON_PAGE)
+        return paginator.get_page(request.GET.get('cursor'))
+    paginator = CountedPaginator(objects, NUMBER_POSTS_ON_PAGE, scope)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     return page_obj
 
 
+@read_from_replica
 def index(request):
-    post_list = Post.objects.all()
-    page_obj = pagination(request, post_list)
+    post_list = feed_queryset()
+    page_obj = pagination(request, post_list, ALL_POSTS)
+    feed = feed_cache_context(request, ALL_POSTS)
     context = {
         'page_obj': page_obj,
+        **feed,
     }
-    return render(request, 'posts/index.html', context)
+    return render_conditional(
+        request, 'posts/index.html', context,
+        [feed['feed_cache_key']] if feed['feed_cacheable'] else None,
+        feed['feed_modified'],
+    )
 
 
+@read_from_replica
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
-    page_obj = pagination(request, post_list)
+    post_list = feed_queryset(group=group)
+    scope = group_scope(group.pk)
+    page_obj = pagination(request, post_list, scope)
+    feed = feed_cache_context(request, scope)
     context = {
         'group': group,
         'page_obj': page_obj,
+        **feed,
     }
-    return render(request, 'posts/group_list.html', context)
+    return render_conditional(
+        request, 'posts/group_list.html', context,
+        [feed['feed_cache_key']] if feed['feed_cacheable'] else None,
+        feed['feed_modified'],
+    )
 
 
+@read_from_replica
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.all()
-    page_obj = pagination(request, post_list)
-    following = request.user.is_authenticated and author.following.exists()
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    post_list = feed_queryset(author=author)
+    scope = author_scope(author.pk)
+    page_obj = pagination(request, post_list, scope)
+    following = is_following(request.user, author)
+    feed = feed_cache_context(request, scope)
     context = {
         'page_obj': page_obj,
         'author': author,
         'following': following,
+        **feed,
+    }
+    return render_conditional(
+        request, 'posts/profile.html', context,
+        [feed['feed_cache_key'], following]
+        if feed['feed_cacheable'] else None,
+        feed['feed_modified'],
+    )
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    # Только постранично: курсор упорядочил бы выдачу по дате, а не по
+    # релевантности.
+    paginator = CountedPaginator(search_posts(query), NUMBER_POSTS_ON_PAGE)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    context = {
+        'query': query,
+        'page_obj': page_obj,
     }
-    return render(request, 'posts/profile.html', context)
+    return render(request, 'posts/search.html', context)
+
+
+def comments_page(request, post):
+    """Страница комментариев в порядке написания, начиная с ?cursor=."""
+    ordering = ('created', 'id')
+    comments = post.comments.select_related('author').only(
+        'id', 'post', 'text', 'created', 'author__username'
+    ).order_by(*ordering)
+    paginator = CursorPaginator(
+        comments, NUMBER_COMMENTS_ON_PAGE, ordering=ordering
+    )
+    return paginator.get_page(request.GET.get('cursor'))
 
 
+def post_versions(post):
+    # Пост, его комментарии и счётчики автора сбрасывают версию автора.
+    return feed_versions([author_scope(post.author_id), ALL_GROUPS])
+
+
+@read_from_replica
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    comment = post.comments.all()
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), pk=post_id
+    )
     form = CommentForm(request.POST or None)
     context = {
         'post': post,
-        'comment': comment,
+        'comments': comments_page(request, post),
         'form': form,
     }
-    return render(request, 'posts/post_detail.html', context)
+    versions = post_versions(post)
+    return render_conditional(
+        request, 'posts/post_detail.html', context,
+        None if replica_may_lag(versions) else versions,
+        max(feed_modified(versions), post.pub_date.timestamp()),
+    )
+
+
+@read_from_replica
+def post_comments(request, post_id):
+    """Следующая страница комментариев: HTML-фрагмент или ?format=json."""
+    post = get_object_or_404(Post.objects.only('author_id'), pk=post_id)
+    comments = comments_page(request, post)
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'comments': [
+                {
+                    'id': comment.pk,
+                    'author': comment.author.username,
+                    'text': comment.text,
+                    'created': comment.created,
+                }
+                for comment in comments
+            ],
+            'next_cursor': comments.next_cursor,
+        })
+    context = {
+        'post': post,
+        'comments': comments,
+    }
+    versions = post_versions(post)
+    return render_conditional(
+        request, 'posts/includes/comment_list.html', context,
+        versions, feed_modified(versions),
+    )
 
 
 @login_required
 def post_create(request):
-    form = PostForm(request.POST or None)
+    form = PostForm(request.POST or None, files=request.FILES or None)
     if not form.is_valid():
         return render(request, 'posts/create_post.html', {'form': form})
     post = form.save(commit=False)
     post.author = request.user
-    post.save()
+    retry_on_locked(post.save)()
+    schedule_image(post.image)
     return redirect('posts:profile', request.user)
 
 
@@ -82,7 +196,10 @@ def post_edit(request, post_id):
         instance=post
     )
     if form.is_valid():
-        form.save()
+        post = form.save(commit=False)
+        # Только поля формы: comments_count меняют сигналы через F().
+        retry_on_locked(post.save)(update_fields=form.changed_data)
+        schedule_image(post.image)
         return redirect('posts:post_detail', post_id=post_id)
     context = {
         'post': post,
@@ -100,17 +217,21 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        retry_on_locked(comment.save)()
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
+@read_from_replica
 def follow_index(request):
-    posts = Post.objects.filter(
-        author__following__user=request.user
-    ).select_related('author', 'group')
+    posts = timeline_queryset(request.user)
     page_obj = pagination(request, posts)
-    context = {'page_obj': page_obj, }
+    context = {
+        'page_obj': page_obj,
+        **feed_cache_context(
+            request, ALL_POSTS, follow_scope(request.user.pk)
+        ),
+    }
     return render(request, 'posts/follow.html', context)
 
 
@@ -119,13 +240,14 @@ def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     user = request.user
     if user != author:
-        Follow.objects.get_or_create(user=user, author=author)
+        retry_on_locked(follow)(user, author)
     return redirect('posts:profile', author)
 
 
 @login_required
 def profile_unfollow(request, username):
     template = 'posts:profile'
-    get_object_or_404(
-        Follow, user=request.user, author__username=username).delete()
+    author = get_object_or_404(User, username=username)
+    if not retry_on_locked(unfollow)(request.user, author):
+        raise Http404
     return redirect(template, username=username)
@@ -0,0 +1,22 @@
+// Подгружает следующую страницу комментариев на место кнопки «Показать ещё».
+document.addEventListener('click', function (event) {
+  var link = event.target.closest('.comments-more');
+  if (!link) {
+    return;
+  }
+  event.preventDefault();
+  fetch(link.dataset.url, {credentials: 'same-origin'})
+    .then(function (response) {
+      if (!response.ok) {
+        throw new Error(response.statusText);
+      }
+      return response.text();
+    })
+    .then(function (html) {
+      link.insertAdjacentHTML('afterend', html);
+      link.remove();
+    })
+    .catch(function () {
+      window.location = link.href;
+    });
+});
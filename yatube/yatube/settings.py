@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import sys
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -25,6 +26,8 @@ SECRET_KEY = 'sly=+cbjs+&9u+(-@w)cnb3#nrff5!z@((uxg^$zl4z4-%x1@^'
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
+TESTING = 'test' in sys.argv[1:2] or 'pytest' in sys.modules
+
 ALLOWED_HOSTS = [
     'localhost',
     '127.0.0.1',
@@ -50,12 +53,16 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Статика отдаётся до замеров, сессий и прочего
+    'core.middleware.StaticFilesMiddleware',
+    'core.middleware.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'core.middleware.ReplicaPinMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -63,7 +70,8 @@ ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Шаблоны Django с замером времени отрисовки для Server-Timing
+        'BACKEND': 'core.template_backends.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -84,13 +92,40 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# SQLite в режиме WAL с прагмами для конкурентной записи, см.
+# core/db/sqlite3/base.py. Соединение живёт между запросами.
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'core.db.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 60,
+        # Тестовая база в файле: в памяти нет WAL и настоящих блокировок.
+        'TEST': {
+            'NAME': os.path.join(BASE_DIR, 'test_db.sqlite3'),
+        },
     }
 }
 
+# Реплики только для чтения: пути к копиям базы через запятую в
+# YATUBE_DB_REPLICAS. В тестах реплики смотрят в тестовую основную базу.
+DATABASE_REPLICAS = []
+for number, path in enumerate(
+    filter(None, os.environ.get('YATUBE_DB_REPLICAS', '').split(',')), 1
+):
+    DATABASES[f'replica_{number}'] = {
+        **DATABASES['default'],
+        'NAME': path,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{number}')
+
+DATABASE_ROUTERS = ['core.db.routers.ReplicaRouter']
+# Сколько секунд после записи клиент читает с основной базы
+REPLICA_PIN_SECONDS = 10
+# Сколько секунд обратный прокси может отдавать гостям ленты и посты
+# без обращения к сайту
+PUBLIC_PAGE_CACHE_SECONDS = 10
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -132,6 +167,13 @@ STATIC_URL = '/static/'
 
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 
+# collectstatic собирает файлы с хешем в именах и сжатыми копиями, их
+# отдаёт core.middleware.StaticFilesMiddleware с кешем на год
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+STATICFILES_STORAGE = 'core.staticfiles.CompressedManifestStaticFilesStorage'
+# Сколько кешируется статика без хеша в имени
+STATIC_MAX_AGE = 60
+
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 # LOGOUT_REDIRECT_URL = 'posts:index' мне не поравилось, перенаправляет без сообщения
@@ -143,9 +185,83 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, '../sent_emails')
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Загрузки пишутся во временный файл частями, а не собираются в памяти
+FILE_UPLOAD_HANDLERS = ['posts.uploads.ImageUploadHandler']
 
+# Keyset-пагинация лент по (pub_date, id) вместо COUNT(*) и OFFSET
+POSTS_CURSOR_PAGINATION = False
+
+# Миниатюры режутся в фоне, шаблоны до этого показывают оригинал
+THUMBNAIL_BACKEND = 'posts.thumbnails.ThumbnailBackend'
+# В тестах миниатюры режутся сразу: фоновый поток мог бы писать во
+# временный MEDIA_ROOT, который тест уже удаляет
+THUMBNAIL_BACKGROUND = not TESTING
+
+# Двухуровневый кеш: небольшой LRU в памяти процесса для фрагментов лент,
+# чьи ключи уже содержат версии, и общий для всех процессов уровень 'shared'.
 CACHES = {
     'default': {
+        'BACKEND': 'core.cache.TwoLevelCache',
+        'OPTIONS': {
+            'SHARED': 'shared',
+            'MAX_ENTRIES': 500,
+            'LOCAL_TIMEOUT': 60,
+            'LOCAL_PREFIXES': ['template.cache.'],
+        },
+    },
+    # В продакшене сюда подставляется Memcached или Redis, например
+    # 'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+    # 'LOCATION': '127.0.0.1:11211',
+    'shared': {
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
+    },
+}
+if TESTING:
+    # Каждый прогон тестов начинает с пустого общего кеша.
+    CACHES['shared'] = {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
     }
+
+# Запросы дольше SLOW_QUERY_MS миллисекунд пишутся в SLOW_QUERY_LOG,
+# для доли SLOW_QUERY_EXPLAIN_RATE из них сохраняется план выполнения.
+# None отключает журнал.
+SLOW_QUERY_MS = 100
+SLOW_QUERY_EXPLAIN_RATE = 0.1
+SLOW_QUERY_LOG = os.path.join(BASE_DIR, 'slow_queries.log')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'slow_queries': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': SLOW_QUERY_LOG,
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'encoding': 'utf-8',
+            'delay': True,
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        'yatube.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
 }
+if TESTING:
+    # Тесты не пишут в журнал проекта: ожидания в BEGIN IMMEDIATE и
+    # нарочно медленные запросы ловит assertLogs.
+    LOGGING['handlers']['slow_queries'] = {'class': 'logging.NullHandler'}